@@ -5,18 +5,21 @@ s3_explain_files.py
 
 import argparse
 import asyncio
+import json
 import os
-from collections import defaultdict
+import random
+import subprocess
+from collections import Counter
 from pathlib import Path
 
-import git
-from openai import AsyncOpenAI
+import httpx
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError, RateLimitError
 from tqdm.asyncio import tqdm as async_tqdm
 import sys
 
 # Add parent directory to path to import utils
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from utils.utils import get_output_path
+from utils.utils import AsyncRateLimiter, get_output_base, get_output_path, git_command, git_env
 
 
 # Prompt 模板
@@ -30,53 +33,164 @@ EXPLAIN_PROMPT = """这个我完全看不懂讲的啥 你觉得能不能列一
 ```"""
 
 
+# 小文件批量 prompt：要求模型用统一分隔符逐个回答，便于拆分
+FILE_DELIM = "=== FILE: "
+
+BATCH_EXPLAIN_PROMPT = """下面这些文件我完全看不懂讲的啥 你觉得能不能列一个list 列一个task的todo 逐渐的给我一步一步讲讲每个文件的观点。请说中文
+
+请按输入顺序依次解释每个文件，每个文件的解释必须以单独一行 `=== FILE: 文件路径 ===` 开头。
+
+{files_block}"""
+
+
+# 瞬时错误（429/超时/5xx）重试次数
+MAX_RETRIES = 5
+
+# 超长文件（生成代码、vendored JSON 等）截断阈值：保留头尾各一半，
+# 避免撑爆 prompt 预算、拉长延迟还触发 finish_reason=length
+MAX_CHARS = 60000
+
+# 低于 SMALL_FILE_CHARS 的小文件（一行的 __init__.py 之类）合并成一个批次，
+# 单批次内容总量不超过 BATCH_MAX_CHARS，省掉逐文件的 API 往返开销
+SMALL_FILE_CHARS = 8000
+BATCH_MAX_CHARS = 40000
+
+
+async def _chat_with_retry(
+    prompt: str,
+    client: AsyncOpenAI,
+    model: str,
+    limiter: AsyncRateLimiter | None = None,
+) -> str:
+    """
+    调用 Gemini API（带限流和指数退避重试），返回去除首尾空白的响应文本
+
+    Raises:
+        openai API 异常（重试耗尽后），由调用方决定失败处理
+    """
+    for attempt in range(MAX_RETRIES):
+        try:
+            if limiter:
+                async with limiter:
+                    response = await client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=32000,
+                        temperature=0.7,
+                    )
+            else:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=32000,
+                    temperature=0.7,
+                )
+            break
+        except (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError):
+            # 429/网络抖动/5xx：指数退避 + 随机抖动后重试
+            if attempt == MAX_RETRIES - 1:
+                raise
+            await asyncio.sleep(2**attempt + random.random())
+
+    finish_reason = response.choices[0].finish_reason
+    content = response.choices[0].message.content or ""
+
+    if finish_reason == "length":
+        content += "\n\n_（注：响应因长度限制被截断）_"
+
+    return content.strip()
+
+
 async def ask_gemini_async(
     file_path: str,
     file_content: str,
+    output_file: Path,
     client: AsyncOpenAI,
-    model: str = "gemini-3-pro-preview"
-) -> str:
+    model: str = "gemini-3-pro-preview",
+    limiter: AsyncRateLimiter | None = None,
+) -> bool:
     """
-    异步调用 Gemini API 解释文件内容
+    异步调用 Gemini API 解释文件内容，流式写入输出文件（带限流和指数退避重试）
+
+    响应以 stream=True 逐块写入 .tmp 文件，成功后原子改名为正式输出——
+    内存占用与响应长度无关，中途崩溃也不会留下半截的"已完成"文件。
 
     Args:
         file_path: 文件路径
         file_content: 文件内容
+        output_file: 输出 Markdown 文件路径
         client: AsyncOpenAI 客户端
         model: 使用的模型
+        limiter: 可选的速率限制器（按 RPM 限流）
 
     Returns:
-        解释文本（Markdown 格式）
-    """
-    prompt = EXPLAIN_PROMPT.format(file_path=file_path, file_content=file_content)
+        是否成功写入（空响应返回 False，不写输出文件，下次运行会重新生成）
 
-    try:
-        response = await client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=32000,
-            temperature=0.7,
+    Raises:
+        openai API 异常（重试耗尽后），由调用方决定失败处理
+    """
+    if len(file_content) > MAX_CHARS:
+        dropped = len(file_content) - MAX_CHARS
+        print(f"✂️  {file_path} 过长，截断中间 {dropped} 个字符")
+        file_content = (
+            file_content[: MAX_CHARS // 2]
+            + f"\n...[中间截断 {dropped} 个字符]...\n"
+            + file_content[-MAX_CHARS // 2 :]
         )
 
-        # 调试信息
-        finish_reason = response.choices[0].finish_reason
-        content = response.choices[0].message.content or ""
-
-        if finish_reason == "length":
-            content += "\n\n_（注：响应因长度限制被截断）_"
-
-        content = content.strip()
-
-        # 检查响应是否为空
-        if not content:
-            return "# 解释生成失败\n\n该文件的 AI 解读内容为空，可能是 API 返回了空响应。请尝试使用 --force 参数重新生成。"
-
-        return content
-    except Exception as e:
-        return f"# 解释失败\n\n错误信息: {str(e)}"
-
+    prompt = EXPLAIN_PROMPT.format(file_path=file_path, file_content=file_content)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = output_file.with_suffix(output_file.suffix + ".tmp")
 
-def get_top_files(repo_path: str, subdir: str, top_n: int | None = None) -> list[tuple[str, int]]:
+    for attempt in range(MAX_RETRIES):
+        try:
+            if limiter:
+                await limiter.acquire()
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=32000,
+                temperature=0.7,
+                stream=True,
+            )
+            written = 0
+            finish_reason = None
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.write(f"# {file_path}\n\n")
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content or ""
+                    if delta:
+                        f.write(delta)
+                        written += len(delta)
+                    if chunk.choices[0].finish_reason:
+                        finish_reason = chunk.choices[0].finish_reason
+                if finish_reason == "length":
+                    f.write("\n\n_（注：响应因长度限制被截断）_")
+            break
+        except (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError):
+            # 429/网络抖动/5xx（包括流中途断开）：指数退避 + 随机抖动后重试
+            if attempt == MAX_RETRIES - 1:
+                tmp_file.unlink(missing_ok=True)
+                raise
+            await asyncio.sleep(2**attempt + random.random())
+
+    if written == 0:
+        tmp_file.unlink(missing_ok=True)
+        return False
+
+    tmp_file.replace(output_file)
+    return True
+
+
+def get_top_files(
+    repo_path: str,
+    subdir: str,
+    top_n: int | None = None,
+    max_commits: int | None = None,
+    since: str | None = None,
+) -> list[tuple[str, int]]:
     """
     获取指定子目录下修改次数最多的文件（按修改次数排序）
 
@@ -84,41 +198,100 @@ def get_top_files(repo_path: str, subdir: str, top_n: int | None = None) -> list
         repo_path: 仓库路径
         subdir: 子目录（相对于仓库根目录，空字符串或"."表示整个仓库）
         top_n: 返回前 N 个文件，None 表示返回全部
+        max_commits: 最多统计最近 N 个 commit，None/0 表示不限制
+        since: 只统计某日期之后的 commit（传给 git log --since）
 
     Returns:
         [(相对文件路径, 修改次数), ...] 列表（已按修改次数降序排序）
     """
-    repo = git.Repo(repo_path)
-    file_change_count = defaultdict(int)
+    max_commits = max_commits or None  # 0 表示不限制
+    file_change_count: Counter = Counter()
+
+    # 缓存按 HEAD SHA + subdir 命名，HEAD 未变时直接复用上次统计结果
+    head = subprocess.run(
+        git_command(repo_path, "rev-parse", "HEAD"),
+        capture_output=True,
+        text=True,
+        env=git_env(),
+    ).stdout.strip()
+    cache_key = (subdir or "all").replace("/", "_")
+    if max_commits:
+        cache_key += f"_n{max_commits}"
+    if since:
+        cache_key += f"_since{since}"
+    cache_path = None
+    if head:
+        cache_path = Path(get_output_base(repo_path)) / f".changes_cache_{head}_{cache_key}.json"
+
+    if cache_path is not None and cache_path.exists():
+        print(f"⚡ 命中缓存: {cache_path}")
+        file_change_count.update(json.loads(cache_path.read_text(encoding="utf-8")))
+        return _filter_existing_files(repo_path, file_change_count, top_n)
 
     # 处理 subdir 参数
+    # --diff-filter=AMD 跳过纯元数据变更（mode/rename 等），只看增删改
+    argv = git_command(
+        repo_path, "log",
+        "--pretty=format:", "--name-only", "--no-renames", "--diff-filter=AMD",
+        "HEAD",
+    )
+    if max_commits:
+        argv += ["-n", str(max_commits)]
+    if since:
+        argv += [f"--since={since}"]
+
     if not subdir or subdir == ".":
         print("📊 分析整个仓库的文件修改历史...")
-        filter_prefix = None
     else:
         print(f"📊 分析 {subdir}/ 下的文件修改历史...")
-        filter_prefix = subdir + "/"
-
-    for commit in repo.iter_commits():
-        try:
-            if commit.parents:
-                diffs = commit.parents[0].diff(commit)
-                for diff in diffs:
-                    file_path = diff.a_path or diff.b_path
-                    if file_path:
-                        # 如果指定了 subdir，只统计该目录下的文件
-                        if filter_prefix is None or file_path.startswith(filter_prefix):
-                            file_change_count[file_path] += 1
-        except Exception:
-            continue
-
-    # 只保留当前存在的文件
-    repo_root = Path(repo_path)
-    existing_files = []
-    for file_path, count in file_change_count.items():
-        full_path = repo_root / file_path
-        if full_path.is_file():
-            existing_files.append((file_path, count))
+        # 用 git pathspec 过滤子目录，避免 Python 侧逐行 startswith
+        argv += ["--", subdir + "/"]
+
+    # 一次 git log 调用输出所有 commit 修改过的文件名，流式攒批后
+    # 用 Counter.update 批量计数（C 层循环，比逐行 += 1 快）
+    proc = subprocess.Popen(argv, stdout=subprocess.PIPE, text=True, env=git_env())
+    buffer = []
+    for line in proc.stdout:
+        file_path = line.rstrip()
+        if file_path:
+            buffer.append(file_path)
+            if len(buffer) >= 10000:
+                file_change_count.update(buffer)
+                buffer.clear()
+    if buffer:
+        file_change_count.update(buffer)
+    proc.wait()
+
+    # 写入缓存，下次 HEAD 未变时直接复用；顺手清掉旧 HEAD 留下的缓存，
+    # 不然每次 pull 之后目录里都会多攒一批永远不会命中的文件
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps(dict(file_change_count)), encoding="utf-8")
+        for old_path in cache_path.parent.glob(".changes_cache_*.json"):
+            if not old_path.name.startswith(f".changes_cache_{head}_"):
+                old_path.unlink(missing_ok=True)
+
+    return _filter_existing_files(repo_path, file_change_count, top_n)
+
+
+def _filter_existing_files(
+    repo_path: str, file_change_count: dict[str, int], top_n: int | None
+) -> list[tuple[str, int]]:
+    """只保留当前存在的文件，并按修改次数降序排序"""
+    # 一次 git ls-tree 拿到 HEAD 中所有文件，避免逐历史路径 stat
+    existing = set(
+        subprocess.run(
+            git_command(repo_path, "ls-tree", "-r", "--name-only", "HEAD"),
+            capture_output=True,
+            text=True,
+            env=git_env(),
+        ).stdout.splitlines()
+    )
+    existing_files = [
+        (file_path, count)
+        for file_path, count in file_change_count.items()
+        if file_path in existing
+    ]
 
     # 按修改次数排序
     existing_files.sort(key=lambda x: x[1], reverse=True)
@@ -139,7 +312,7 @@ async def explain_file_async(
     client: AsyncOpenAI,
     force: bool = False,
     model: str = "gemini-2.5-pro",
-    semaphore: asyncio.Semaphore | None = None,
+    limiter: AsyncRateLimiter | None = None,
 ) -> tuple[str, bool]:
     """
     异步解释单个文件并保存为 Markdown
@@ -151,21 +324,14 @@ async def explain_file_async(
         client: AsyncOpenAI 客户端
         force: 是否强制重新生成
         model: 使用的模型
-        semaphore: 信号量，用于控制并发数
+        limiter: 可选的速率限制器
 
     Returns:
         (文件路径, 是否成功)
     """
-    # 使用信号量控制并发
-    if semaphore:
-        async with semaphore:
-            return await _explain_file_impl(
-                repo_path, file_rel_path, output_base, client, force, model
-            )
-    else:
-        return await _explain_file_impl(
-            repo_path, file_rel_path, output_base, client, force, model
-        )
+    return await _explain_file_impl(
+        repo_path, file_rel_path, output_base, client, force, model, limiter
+    )
 
 
 async def _explain_file_impl(
@@ -175,53 +341,191 @@ async def _explain_file_impl(
     client: AsyncOpenAI,
     force: bool,
     model: str,
+    limiter: AsyncRateLimiter | None = None,
 ) -> tuple[str, bool]:
     """
     实际的文件解释实现
     """
     # 构建输入输出路径
+    # （已存在的有效解读在 process_files_batch 分发前就被过滤掉了，
+    # 这里不再逐文件 stat 检查）
     repo_root = Path(repo_path)
     input_file = repo_root / file_rel_path
     output_file = Path(output_base) / (file_rel_path + ".md")
 
-    # 检查是否已存在
-    if output_file.exists() and not force:
-        # 检查文件是否有效（不是空文件或只有标题的失败文件）
-        try:
-            existing_content = output_file.read_text(encoding="utf-8")
-            # 如果文件太小（小于100字节），可能是空响应的结果，需要重新生成
-            if len(existing_content) < 100:
-                print(f"⚠️  {file_rel_path} 的解读文件太小，将重新生成")
-            else:
-                return (file_rel_path, True)  # 跳过，视为成功
-        except Exception:
-            pass  # 读取失败，继续重新生成
-
-    # 读取文件内容
+    # 读取文件内容（放到线程池，避免磁盘慢时阻塞事件循环上的其他网络请求）
     try:
-        with open(input_file, "r", encoding="utf-8") as f:
-            content = f.read()
+        content = await asyncio.to_thread(input_file.read_text, encoding="utf-8")
     except Exception as e:
         print(f"❌ 读取失败 {file_rel_path}: {e}")
         return (file_rel_path, False)
 
-    # 调用 Gemini（异步）
+    # 调用 Gemini 并流式写入输出；失败时不留输出文件，下次运行会重新生成
     try:
-        explanation = await ask_gemini_async(file_rel_path, content, client, model)
+        ok = await ask_gemini_async(file_rel_path, content, output_file, client, model, limiter)
     except Exception as e:
         print(f"❌ API 调用失败 {file_rel_path}: {e}")
         return (file_rel_path, False)
 
-    # 保存结果
+    if not ok:
+        print(f"⚠️  {file_rel_path} 的响应为空，下次运行会重新生成")
+    return (file_rel_path, ok)
+
+
+async def explain_small_files_batch(
+    repo_path: str,
+    file_paths: list[str],
+    output_base: str,
+    client: AsyncOpenAI,
+    model: str,
+    limiter: AsyncRateLimiter | None = None,
+) -> list[tuple[str, bool]]:
+    """
+    一次 API 调用解释多个小文件，按分隔符拆分响应后分别保存
+
+    Args:
+        repo_path: 仓库路径
+        file_paths: 小文件相对路径列表（内容总量应低于 BATCH_MAX_CHARS）
+        output_base: 输出基础目录
+        client: AsyncOpenAI 客户端
+        model: 使用的模型
+        limiter: 可选的速率限制器
+
+    Returns:
+        [(文件路径, 是否成功), ...] 列表
+    """
+    repo_root = Path(repo_path)
+    results: list[tuple[str, bool]] = []
+    blocks = []
+    included = []
+    for rel in file_paths:
+        try:
+            text = await asyncio.to_thread((repo_root / rel).read_text, encoding="utf-8")
+        except Exception as e:
+            print(f"❌ 读取失败 {rel}: {e}")
+            results.append((rel, False))
+            continue
+        blocks.append(f"{FILE_DELIM}{rel} ===\n```\n{text}\n```")
+        included.append(rel)
+
+    if not included:
+        return results
+
+    prompt = BATCH_EXPLAIN_PROMPT.format(files_block="\n\n".join(blocks))
     try:
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(f"# {file_rel_path}\n\n")
-            f.write(explanation)
-        return (file_rel_path, True)
+        answer = await _chat_with_retry(prompt, client, model, limiter)
     except Exception as e:
-        print(f"❌ 保存失败 {file_rel_path}: {e}")
-        return (file_rel_path, False)
+        print(f"❌ API 调用失败（{len(included)} 个小文件的批次）: {e}")
+        return results + [(rel, False) for rel in included]
+
+    # 按分隔符拆回每个文件的解释
+    sections: dict[str, str] = {}
+    for part in answer.split(FILE_DELIM)[1:]:
+        header, _, body = part.partition("\n")
+        sections[header.replace("===", "").strip()] = body.strip()
+
+    for rel in included:
+        explanation = sections.get(rel)
+        if not explanation:
+            # 模型没按格式回答时不写文件，下次运行会重新生成
+            print(f"⚠️  批次响应中缺少 {rel} 的解释")
+            results.append((rel, False))
+            continue
+        output_file = Path(output_base) / (rel + ".md")
+        try:
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            await asyncio.to_thread(
+                output_file.write_text, f"# {rel}\n\n{explanation}", encoding="utf-8"
+            )
+            results.append((rel, True))
+        except Exception as e:
+            print(f"❌ 保存失败 {rel}: {e}")
+            results.append((rel, False))
+    return results
+
+
+def _pack_jobs(repo_path: str, files: list[tuple[str, int]]) -> list[list[str]]:
+    """
+    把文件列表打包成任务：大文件单独一个任务，小文件按 BATCH_MAX_CHARS 贪心装箱
+
+    Returns:
+        任务列表，每个任务是一组文件相对路径（单元素 = 单文件任务）
+    """
+    repo_root = Path(repo_path)
+    jobs: list[list[str]] = []
+    batch: list[str] = []
+    batch_size = 0
+    for p, _ in files:
+        try:
+            size = (repo_root / p).stat().st_size
+        except OSError:
+            size = SMALL_FILE_CHARS + 1
+        if size > SMALL_FILE_CHARS:
+            jobs.append([p])
+            continue
+        if batch and batch_size + size > BATCH_MAX_CHARS:
+            jobs.append(batch)
+            batch, batch_size = [], 0
+        batch.append(p)
+        batch_size += size
+    if batch:
+        jobs.append(batch)
+    return jobs
+
+
+def _head_blob_shas(repo_path: str) -> dict[str, str]:
+    """
+    一次 git ls-tree 调用获取 HEAD 中所有文件的 blob SHA
+
+    Returns:
+        {相对文件路径: blob SHA} 字典
+    """
+    proc = subprocess.run(
+        git_command(repo_path, "ls-tree", "-r", "HEAD"),
+        capture_output=True,
+        text=True,
+        env=git_env(),
+    )
+    shas: dict[str, str] = {}
+    for line in proc.stdout.splitlines():
+        # 每行格式: "<mode> blob <sha>\t<path>"
+        meta, _, path = line.partition("\t")
+        parts = meta.split()
+        if len(parts) == 3 and parts[1] == "blob":
+            shas[path] = parts[2]
+    return shas
+
+
+def _write_explain_cache(cache_file: Path, cache: dict[str, str]):
+    """原子写入 blob SHA 缓存（先写临时文件再改名）"""
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_file.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(cache), encoding="utf-8")
+    tmp.replace(cache_file)
+
+
+def _existing_outputs(output_base: str) -> set[str]:
+    """
+    一次性枚举已生成的解读文件（相对于 output_base 的路径集合）
+
+    小于 100 字节的文件可能是空响应的结果，不算有效，会被重新生成。
+    用 os.scandir 递归遍历，避免逐文件 stat 检查存在性。
+    """
+    base = Path(output_base)
+    existing: set[str] = set()
+    if not base.exists():
+        return existing
+
+    stack = [str(base)]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and entry.stat().st_size >= 100:
+                    existing.add(os.path.relpath(entry.path, str(base)))
+    return existing
 
 
 async def process_files_batch(
@@ -231,6 +535,7 @@ async def process_files_batch(
     force: bool,
     model: str,
     max_workers: int = 16,
+    rpm: int = 0,
 ):
     """
     批量异步处理文件
@@ -242,7 +547,45 @@ async def process_files_batch(
         force: 是否强制重新生成
         model: 使用的模型
         max_workers: 最大并发数（默认 16）
+        rpm: 每分钟最大请求数，0 表示不限流
     """
+    # blob SHA 缓存：源文件内容没变（且输出存在）才算新鲜，变了就重新生成
+    blob_shas = _head_blob_shas(repo_path)
+    cache_file = Path(output_base) / ".explain_cache.json"
+    try:
+        cache: dict[str, str] = json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        cache = {}
+
+    # 先过滤掉已生成且源文件未变的文件，增量运行时不再逐文件 stat
+    total = len(files)
+    skipped = 0
+    if not force:
+        existing = _existing_outputs(output_base)
+        remaining = []
+        for p, c in files:
+            if p + ".md" not in existing:
+                remaining.append((p, c))
+                continue
+            cached_sha = cache.get(p)
+            if cached_sha is not None and cached_sha != blob_shas.get(p):
+                # 源文件变了，解读已过期
+                remaining.append((p, c))
+                continue
+            # 旧输出没有缓存记录时视为新鲜，补记当前 SHA
+            if cached_sha is None and p in blob_shas:
+                cache[p] = blob_shas[p]
+            skipped += 1
+        files = remaining
+        if skipped:
+            print(f"⏭️  跳过 {skipped} 个已生成且未变化的文件")
+
+    # 没有剩余工作时连 API 客户端都不用创建
+    if not files:
+        print("✓ 所有文件均已生成")
+        _write_explain_cache(cache_file, cache)
+        return skipped, total
+
     api_key = os.getenv("OPENAI_API_KEY")
     base_url = os.getenv("OPENAI_BASE_URL")
 
@@ -250,31 +593,74 @@ async def process_files_batch(
         raise ValueError("需要设置环境变量 OPENAI_API_KEY")
 
     # 创建异步客户端
-    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+    # HTTP/2 让所有并发请求复用同一条 TCP/TLS 连接，重试时也不用重新握手
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_keepalive_connections=max_workers,
+            max_connections=max_workers * 2,
+        ),
+        timeout=httpx.Timeout(120),
+    )
+    client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
 
-    # 创建信号量控制并发数
-    semaphore = asyncio.Semaphore(max_workers)
+    # 可选的 RPM 限流器，避免撞到配额后触发重试风暴
+    limiter = AsyncRateLimiter(max_rate=rpm) if rpm else None
 
-    # 创建所有任务
-    tasks = [
-        explain_file_async(
-            repo_path, file_path, output_base, client, force, model, semaphore
-        )
-        for file_path, _ in files
-    ]
+    # 用有界队列 + 固定数量 worker 的生产者/消费者模式，
+    # 避免为 10k 级别的仓库一次性物化所有协程和文件内容
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_workers * 2)
 
-    # 使用 tqdm 异步进度条
-    print(f"\n⚡ 使用 {max_workers} 个并发 worker 处理 {len(tasks)} 个文件")
+    # 小文件装箱后一次 API 调用解释多个，大文件仍然逐个处理
+    jobs = _pack_jobs(repo_path, files)
+    n_batched = sum(1 for job in jobs if len(job) > 1)
+    print(f"\n⚡ 使用 {max_workers} 个并发 worker 处理 {len(files)} 个文件（{len(jobs)} 次调用，其中 {n_batched} 个小文件批次）")
     print()
 
     results = []
-    for coro in async_tqdm.as_completed(tasks, desc="解释文件", unit="file"):
-        result = await coro
-        results.append(result)
-
-    # 统计结果
+    pbar = async_tqdm(total=len(files), desc="解释文件", unit="file")
+
+    async def worker():
+        while True:
+            job = await queue.get()
+            if job is None:
+                queue.task_done()
+                break
+            if len(job) == 1:
+                result = await explain_file_async(
+                    repo_path, job[0], output_base, client, force, model, limiter
+                )
+                results.append(result)
+            else:
+                results.extend(
+                    await explain_small_files_batch(
+                        repo_path, job, output_base, client, model, limiter
+                    )
+                )
+            pbar.update(len(job))
+            queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max_workers)]
+
+    # 生产者：队列满时会反压，保持工作集约为 max_workers 个任务
+    for job in jobs:
+        await queue.put(job)
+    for _ in range(max_workers):
+        await queue.put(None)
+
+    await asyncio.gather(*workers)
+    pbar.close()
+    await client.close()
+
+    # 成功生成的文件记录当前 blob SHA，缓存整体原子写入一次
+    for file_path, success in results:
+        if success and file_path in blob_shas:
+            cache[file_path] = blob_shas[file_path]
+    _write_explain_cache(cache_file, cache)
+
+    # 统计结果（跳过的文件视为成功）
     success_count = sum(1 for _, success in results if success)
-    return success_count, len(results)
+    return success_count + skipped, total
 
 
 async def main_async():
@@ -288,6 +674,16 @@ async def main_async():
     parser.add_argument("--force", action="store_true", help="强制重新生成")
     parser.add_argument("--model", "-m", default="gemini-3-pro-preview", help="使用的模型")
     parser.add_argument("--workers", "-w", type=int, default=16, help="最大并发数（默认：16）")
+    parser.add_argument(
+        "--rpm", type=int, default=0, help="每分钟最大请求数，0 表示不限流（默认：0）"
+    )
+    parser.add_argument(
+        "--max-commits", type=int, default=5000,
+        help="最多统计最近 N 个 commit，0 表示不限制 (默认: 5000)",
+    )
+    parser.add_argument(
+        "--since", help="只统计某日期之后的 commit（如 2024-01-01 或 '1 year ago'）"
+    )
 
     args = parser.parse_args()
 
@@ -305,7 +701,10 @@ async def main_async():
         return
 
     # 获取所有文件（按修改次数排序）
-    all_files = get_top_files(args.repo_path, args.subdir, top_n=None)
+    all_files = get_top_files(
+        args.repo_path, args.subdir, top_n=None,
+        max_commits=args.max_commits, since=args.since,
+    )
 
     if not all_files:
         print("❌ 没有找到文件")
@@ -339,6 +738,7 @@ async def main_async():
         args.force,
         args.model,
         args.workers,
+        args.rpm,
     )
 
     print(f"\n🎉 完成！成功解释 {success_count}/{total_count} 个文件")
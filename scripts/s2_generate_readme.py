@@ -5,21 +5,28 @@ s4_generate_readme.py
 
 import argparse
 import asyncio
+import contextlib
+import hashlib
+import json
 import logging
+import math
 import os
+import re
+import shutil
+from collections import Counter, defaultdict, deque
 from pathlib import Path
 
-import tiktoken
+import httpx
 from openai import AsyncOpenAI
 from tqdm.asyncio import tqdm as async_tqdm
 import sys
 
 # Add parent directory to path to import utils
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from utils.utils import get_output_path
+from utils.utils import AsyncRateLimiter, get_output_path, get_tokenizer
 
-# 初始化 tokenizer
-tokenizer = tiktoken.get_encoding("o200k_base")
+# 初始化 tokenizer（进程内共享的单例）
+tokenizer = get_tokenizer()
 
 # 配置 logging
 logging.basicConfig(
@@ -30,6 +37,8 @@ logger = logging.getLogger(__name__)
 
 # 常量
 MAX_TOKENS = 200_000  # 200K token 限制
+RESPONSE_MAX_TOKENS = 32000  # 响应 token 上限（传给 max_tokens）
+MODEL_CONTEXT_LIMIT = 1_000_000  # 模型上下文窗口（prompt + 响应）
 
 # Prompt 模板
 README_PROMPT = """以下是 {folder_path} 目录的结构和**直接内容**：
@@ -56,42 +65,138 @@ README_PROMPT = """以下是 {folder_path} 目录的结构和**直接内容**：
 
 请用简洁、通俗、易懂的语气回答，说中文。"""
 
+# 导入时把模板按占位符切成常量片段，组装 prompt 时只做一次 join，
+# 不用每次调用都让 str.format 重新解析整个模板
+_PROMPT_PARTS = re.split(r"(\{folder_path\}|\{tree_structure\}|\{content\})", README_PROMPT)
+
+
+def _build_prompt(folder_path: str, tree_structure: str, content: str) -> str:
+    """用预切分的模板片段组装 prompt"""
+    values = {
+        "{folder_path}": folder_path,
+        "{tree_structure}": tree_structure,
+        "{content}": content,
+    }
+    return "".join(values.get(part, part) for part in _PROMPT_PARTS)
+
 
 def count_tokens(text: str) -> int:
     """计算文本的 token 数量"""
     return len(tokenizer.encode(text, disallowed_special=()))
 
 
-def truncate_content(contents: list[tuple[str, str, int]], target_tokens: int) -> list[tuple[str, str]]:
+def _tokenize_words(text: str) -> list[str]:
+    """BM25 用的简易分词：小写后按字母/数字/下划线切分"""
+    return re.findall(r"[a-z0-9_]+", text.lower())
+
+
+def _bm25_scores(
+    docs: list[list[str]], query: list[str], k1: float = 1.5, b: float = 0.75
+) -> list[float]:
+    """
+    对每个文档计算 BM25Okapi 相关性分数（标准公式的最小实现，不引入额外依赖）
+
+    Args:
+        docs: 分词后的文档列表
+        query: 分词后的查询
+
+    Returns:
+        与 docs 等长的分数列表
+    """
+    n = len(docs)
+    avgdl = sum(len(d) for d in docs) / n
+    df: Counter = Counter()
+    for d in docs:
+        df.update(set(d))
+
+    scores = []
+    for d in docs:
+        tf = Counter(d)
+        score = 0.0
+        for term in query:
+            if term not in tf:
+                continue
+            idf = math.log((n - df[term] + 0.5) / (df[term] + 0.5) + 1)
+            score += idf * tf[term] * (k1 + 1) / (tf[term] + k1 * (1 - b + b * len(d) / avgdl))
+        scores.append(score)
+    return scores
+
+
+def truncate_content(
+    contents: list[tuple[str, str, list[int]]], target_tokens: int, query_text: str = ""
+) -> list[tuple[str, str]]:
     """
-    等比例截断内容以满足 token 限制
+    按「熵 × BM25 相关性」自适应分配 token 预算
+
+    等比例截断会均匀破坏所有条目；这里给每个条目算一个权重：
+    字符分布的 Shannon 熵衡量信息密度（模板化内容压得更狠），
+    BM25 相关性衡量与文件夹主题的关联。预算按权重注水式分配，
+    装满的条目出局、余量流向其余条目，直到预算耗尽。
 
     Args:
-        contents: [(name, content, token_count), ...]
+        contents: [(name, content, tokens), ...]
         target_tokens: 目标 token 数量
+        query_text: 相关性查询文本（通常是文件夹路径）
 
     Returns:
-        [(name, truncated_content), ...]
+        [(name, truncated_content), ...]（保持原始顺序）
     """
-    total_tokens = sum(tc for _, _, tc in contents)
-    ratio = target_tokens / total_tokens
+    total_tokens = sum(len(tokens) for _, _, tokens in contents)
 
     logger.warning(f"⚠️  内容超出 {MAX_TOKENS:,} tokens 限制")
-    logger.warning(f"   总量: {total_tokens:,} tokens")
-    logger.warning(f"   压缩比例: {ratio:.2%}")
+    logger.warning(f"   总量: {total_tokens:,} tokens，按权重裁剪到 {target_tokens:,}")
+
+    docs = [_tokenize_words(f"{name} {content}") for name, content, _ in contents]
+    query = _tokenize_words(f"{query_text} readme")
+    scores = _bm25_scores(docs, query)
+    max_score = max(scores) or 1.0
+
+    # 字符直方图的 Shannon 熵：信息密度高的条目分到更多预算
+    entropies = []
+    for _, content, _ in contents:
+        freq = Counter(content)
+        n_chars = len(content)
+        h = -sum((c / n_chars) * math.log2(c / n_chars) for c in freq.values()) if n_chars else 0.0
+        entropies.append(h)
+
+    weights = [h * (1 + s / max_score) for h, s in zip(entropies, scores)]
+    sizes = [len(tokens) for _, _, tokens in contents]
+
+    # 保底额度：再不相关的条目也留一点，让模型知道它存在
+    floor = min(200, target_tokens // len(contents))
+    budgets = [min(floor, size) for size in sizes]
+    remaining = target_tokens - sum(budgets)
+
+    # 注水式分配：按权重比例发放，装满的条目出局，余量继续流向其他条目
+    active = [i for i in range(len(contents)) if budgets[i] < sizes[i]]
+    while remaining > 0 and active:
+        weight_sum = sum(weights[i] for i in active)
+        if weight_sum <= 0:
+            break
+        distributed = 0
+        next_active = []
+        for i in active:
+            share = int(remaining * weights[i] / weight_sum)
+            take = min(share, sizes[i] - budgets[i])
+            budgets[i] += take
+            distributed += take
+            if budgets[i] < sizes[i]:
+                next_active.append(i)
+        if distributed == 0:
+            break
+        remaining -= distributed
+        active = next_active
 
     truncated = []
-    for name, content, token_count in contents:
-        # 计算该文件应保留的 token 数量
-        keep_tokens = int(token_count * ratio)
-
-        # 编码后截断，再解码
-        tokens = tokenizer.encode(content, disallowed_special=())
-        truncated_tokens = tokens[:keep_tokens]
-        truncated_content = tokenizer.decode(truncated_tokens)
-
-        truncated.append((name, truncated_content))
-        logger.warning(f"   - {name}: {token_count:,} → {keep_tokens:,} tokens ({ratio:.2%})")
+    for (name, content, tokens), budget in zip(contents, budgets):
+        if budget >= len(tokens):
+            truncated.append((name, content))
+        elif budget > 0:
+            truncated.append((name, tokenizer.decode(tokens[:budget])))
+            logger.warning(f"   - {name}: {len(tokens):,} → {budget:,} tokens")
+        else:
+            truncated.append((name, f"_（为控制总长省略，共 {len(tokens):,} tokens）_"))
+            logger.warning(f"   - {name}: {len(tokens):,} tokens（省略）")
 
     return truncated
 
@@ -123,7 +228,8 @@ def generate_tree_structure(folder_path: Path, explain_base: Path, max_depth: in
 
         # 收集所有项目（文件和文件夹）
         for item in sorted(current_path.iterdir()):
-            if item.name == "README.md":
+            # 跳过 README.md 和隐藏目录（如 .gemini_cache）
+            if item.name == "README.md" or item.name.startswith("."):
                 continue
             items.append(item)
 
@@ -149,13 +255,16 @@ def generate_tree_structure(folder_path: Path, explain_base: Path, max_depth: in
     return "\n".join(tree_lines)
 
 
-def collect_folder_content(folder_path: Path, explain_base: Path) -> str:
+def collect_folder_content(
+    folder_path: Path, explain_base: Path, max_tokens: int = MAX_TOKENS
+) -> str:
     """
     收集文件夹下的所有内容（文件的 .md + 子文件夹的 README.md）
 
     Args:
         folder_path: 当前文件夹路径（相对于 repo 根目录）
         explain_base: explain 输出的基础路径
+        max_tokens: 内容 token 预算（超出时按权重裁剪）
 
     Returns:
         合并后的内容字符串
@@ -165,7 +274,7 @@ def collect_folder_content(folder_path: Path, explain_base: Path) -> str:
     if not explain_folder.exists():
         return ""
 
-    contents = []  # [(name, content, token_count), ...]
+    entries = []  # [(name, content), ...]
 
     # 收集直接子文件的 .md（不包括 README.md）
     for md_file in sorted(explain_folder.glob("*.md")):
@@ -174,30 +283,58 @@ def collect_folder_content(folder_path: Path, explain_base: Path) -> str:
 
         with open(md_file, "r", encoding="utf-8") as f:
             content = f.read()
-            token_count = count_tokens(content)
             # 去掉 .md 后缀作为显示名称
             name = md_file.name[:-3] if md_file.name.endswith(".md") else md_file.name
-            contents.append((f"📄 {name}", content, token_count))
+            entries.append((f"📄 {name}", content))
 
     # 收集子文件夹的 README.md（截断以防止内容传播）
     for subfolder in sorted(explain_folder.iterdir()):
-        if subfolder.is_dir():
+        if subfolder.is_dir() and not subfolder.name.startswith("."):
             readme = subfolder / "README.md"
             if readme.exists():
                 with open(readme, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    token_count = count_tokens(content)
-                    contents.append((f"📁 {subfolder.name}/", content, token_count))
+                    entries.append((f"📁 {subfolder.name}/", f.read()))
 
-    if not contents:
+    if not entries:
         return ""
 
+    # 跨条目去重：兄弟 README 之间常有整段相同的模板文字（免责声明、
+    # 截断脚注等），只保留第一份，后续出现替换成一行引用。
+    # 在 encode 之前做，省下的 token 直接反映到预算检查里
+    seen_blocks: dict[int, int] = {}  # 段落 hash -> 共享段落编号
+    deduped = []
+    for name, content in entries:
+        out_blocks = []
+        for block in content.split("\n\n"):
+            # 短块（标题、分隔线）不值得替换成引用
+            if len(block) < 120:
+                out_blocks.append(block)
+                continue
+            key = hash(block.strip())
+            if key in seen_blocks:
+                out_blocks.append(f"> （与共享段落 #{seen_blocks[key]} 相同，略）")
+            else:
+                seen_blocks[key] = len(seen_blocks) + 1
+                out_blocks.append(block)
+        deduped.append((name, "\n\n".join(out_blocks)))
+    entries = deduped
+
+    # 一次批量 encode 所有文件：tiktoken 的 Rust 核心会在内部线程池并行，
+    # 比逐文件调用快得多；token 数组留给截断阶段复用
+    all_tokens = tokenizer.encode_ordinary_batch(
+        [content for _, content in entries], num_threads=os.cpu_count()
+    )
+    contents = [
+        (name, content, tokens)
+        for (name, content), tokens in zip(entries, all_tokens)
+    ]
+
     # 计算总 token 数
-    total_tokens = sum(tc for _, _, tc in contents)
+    total_tokens = sum(len(tokens) for _, _, tokens in contents)
 
     # 如果超过限制，截断
-    if total_tokens > MAX_TOKENS:
-        contents_text = truncate_content(contents, MAX_TOKENS)
+    if total_tokens > max_tokens:
+        contents_text = truncate_content(contents, max_tokens, str(folder_path))
     else:
         contents_text = [(name, content) for name, content, _ in contents]
 
@@ -213,45 +350,105 @@ async def ask_gemini_async(
     folder_path: str,
     content: str,
     tree_structure: str,
+    readme_path: Path,
     client: AsyncOpenAI,
-    model: str = "gemini-3-pro-preview"
-) -> str:
+    model: str = "gemini-3-pro-preview",
+    rpm_limiter: AsyncRateLimiter | None = None,
+    tpm_limiter: AsyncRateLimiter | None = None,
+    cache_dir: Path | None = None,
+    refresh: bool = False,
+    semaphore: asyncio.Semaphore | None = None,
+) -> bool:
     """
-    异步调用 Gemini API 生成 README
+    异步调用 Gemini API 生成 README，流式写入 readme_path
+
+    响应以 stream=True 逐块写入 .tmp 文件，成功后原子改名——内存占用
+    与响应长度无关，中途崩溃也不会留下半截的 README。
+    信号量只在真正发请求和消费响应流时持有——prompt 组装、token
+    预估和缓存读写都在槽位之外，API 槽不会被磁盘/CPU 工作占着。
 
     Args:
-        folder_path: 文件夹路径
+        folder_path: 文件夹路径（用作 README 标题）
         content: 文件夹内容
         tree_structure: 目录树结构
+        readme_path: README.md 输出路径
         client: AsyncOpenAI 客户端
         model: 使用的模型
+        rpm_limiter: 可选的请求数限流器（每分钟请求数）
+        tpm_limiter: 可选的 token 限流器（每分钟 prompt token 数）
+        cache_dir: 可选的响应缓存目录（按 prompt+model 哈希寻址）
+        refresh: 跳过缓存读取（仍会写入），配合 --force 使用
+        semaphore: 可选的 API 并发信号量
 
     Returns:
-        README 内容（Markdown 格式）
+        是否成功写入 README
     """
-    prompt = README_PROMPT.format(
-        folder_path=folder_path,
-        tree_structure=tree_structure,
-        content=content
-    )
-
+    prompt = _build_prompt(folder_path, tree_structure, content)
+    readme_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # 内容寻址缓存：prompt 和模型都没变时直接复用上次的响应——
+    # 改一个叶子文件后重跑，只有收集内容真正变化的祖先才会打 API
+    cache_file = None
+    if cache_dir is not None:
+        key = hashlib.blake2b(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+        cache_file = cache_dir / f"{key}.md"
+        if not refresh and cache_file.exists():
+            await asyncio.to_thread(shutil.copyfile, cache_file, readme_path)
+            return True
+
+    # TPM 的 token 预估是 CPU 工作，放在信号量之外
+    prompt_tokens = await asyncio.to_thread(count_tokens, prompt) if tpm_limiter else 0
+
+    tmp_path = readme_path.with_suffix(readme_path.suffix + ".tmp")
     try:
-        response = await client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=32000,
-            temperature=0.7,
-        )
+        async with semaphore if semaphore is not None else contextlib.nullcontext():
+            # 限流：TPM 按预估 prompt token 扣额度，RPM 按请求数；
+            # 平滑突发流量，避免撞到配额后 429 重试风暴
+            if tpm_limiter:
+                await tpm_limiter.acquire(prompt_tokens)
+            if rpm_limiter:
+                await rpm_limiter.acquire()
+
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=RESPONSE_MAX_TOKENS,
+                temperature=0.7,
+                stream=True,
+            )
 
-        finish_reason = response.choices[0].finish_reason
-        content = response.choices[0].message.content or ""
+            written = 0
+            finish_reason = None
+            # 二进制模式写入：显式 encode 一次，绕过 TextIOWrapper 的增量编码器，
+            # 高并发下每个 chunk 的 CPU 开销明显更低
+            with open(tmp_path, "wb") as f:
+                f.write(f"# {folder_path}\n\n".encode("utf-8"))
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content or ""
+                    if delta:
+                        f.write(delta.encode("utf-8"))
+                        written += len(delta)
+                    if chunk.choices[0].finish_reason:
+                        finish_reason = chunk.choices[0].finish_reason
+                if finish_reason == "length":
+                    f.write("\n\n_（注：响应因长度限制被截断）_".encode("utf-8"))
+    except Exception as e:
+        logger.error(f"❌ API 调用失败 {folder_path}: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return False
 
-        if finish_reason == "length":
-            content += "\n\n_（注：响应因长度限制被截断）_"
+    if written == 0:
+        # 空响应不算成功，也不写文件，下次运行会重新生成
+        tmp_path.unlink(missing_ok=True)
+        return False
 
-        return content.strip()
-    except Exception as e:
-        return f"# README 生成失败\n\n错误信息: {str(e)}"
+    tmp_path.replace(readme_path)
+    if cache_file is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(shutil.copyfile, readme_path, cache_file)
+    return True
 
 
 async def generate_readme_async(
@@ -261,6 +458,8 @@ async def generate_readme_async(
     force: bool = False,
     model: str = "gemini-3-pro-preview",
     semaphore: asyncio.Semaphore | None = None,
+    rpm_limiter: AsyncRateLimiter | None = None,
+    tpm_limiter: AsyncRateLimiter | None = None,
 ) -> tuple[Path, bool]:
     """
     异步生成单个文件夹的 README.md
@@ -272,20 +471,39 @@ async def generate_readme_async(
         force: 是否强制重新生成
         model: 使用的模型
         semaphore: 信号量，用于控制并发数
+        rpm_limiter: 可选的请求数限流器
+        tpm_limiter: 可选的 token 限流器
 
     Returns:
         (文件夹路径, 是否成功)
     """
-    # 使用信号量控制并发
-    if semaphore:
-        async with semaphore:
-            return await _generate_readme_impl(
-                folder_path, explain_base, client, force, model
-            )
-    else:
-        return await _generate_readme_impl(
-            folder_path, explain_base, client, force, model
-        )
+    # 信号量只限制 API 并发（在 ask_gemini_async 内部持有）：
+    # 文件夹扫描、tokenize、写盘不占 API 槽位
+    return await _generate_readme_impl(
+        folder_path, explain_base, client, force, model, rpm_limiter, tpm_limiter, semaphore
+    )
+
+
+def _folder_inputs_hash(explain_folder: Path, model: str) -> str:
+    """
+    计算文件夹的输入指纹：模型 + prompt 模板 + 各子内容的 sha256
+
+    任何一个直接子文件或子文件夹 README 变化都会改变指纹。
+    只读字节算哈希，比 tokenize + API 调用便宜几个数量级。
+    """
+    child_hashes = []
+    for md_file in sorted(explain_folder.glob("*.md")):
+        if md_file.name == "README.md":
+            continue
+        child_hashes.append(hashlib.sha256(md_file.read_bytes()).hexdigest())
+    for subfolder in sorted(explain_folder.iterdir()):
+        if subfolder.is_dir() and not subfolder.name.startswith("."):
+            readme = subfolder / "README.md"
+            if readme.exists():
+                child_hashes.append(hashlib.sha256(readme.read_bytes()).hexdigest())
+
+    combined = "\0".join([model, README_PROMPT] + child_hashes)
+    return hashlib.sha256(combined.encode("utf-8")).hexdigest()
 
 
 async def _generate_readme_impl(
@@ -294,6 +512,9 @@ async def _generate_readme_impl(
     client: AsyncOpenAI,
     force: bool,
     model: str,
+    rpm_limiter: AsyncRateLimiter | None = None,
+    tpm_limiter: AsyncRateLimiter | None = None,
+    semaphore: asyncio.Semaphore | None = None,
 ) -> tuple[Path, bool]:
     """
     实际的 README 生成实现
@@ -303,40 +524,72 @@ async def _generate_readme_impl(
     if not explain_folder.exists():
         return (folder_path, False)
 
-    # 检查当前文件夹是否已有 README.md
+    # 语义新鲜度检查：输入指纹（模型 + 模板 + 各子内容哈希）没变才跳过，
+    # 子内容变了会自动重新生成，不再依赖 --force 手动传播
     readme_path = explain_folder / "README.md"
+    meta_path = explain_folder / ".meta.json"
+    inputs_hash = await asyncio.to_thread(_folder_inputs_hash, explain_folder, model)
     if readme_path.exists() and not force:
-        return (folder_path, True)  # 跳过，视为成功
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = None
+        if meta is None:
+            # 旧输出没有 meta 时视为新鲜，补记当前指纹
+            await asyncio.to_thread(
+                meta_path.write_text,
+                json.dumps({"model": model, "inputs_hash": inputs_hash}),
+                encoding="utf-8",
+            )
+            return (folder_path, True)
+        if meta.get("inputs_hash") == inputs_hash:
+            return (folder_path, True)  # 输入没变，跳过
 
-    # 收集当前文件夹的内容
-    content = collect_folder_content(folder_path, explain_base)
+    # 收集当前文件夹的内容（读文件 + 批量 encode 都放到线程池，不阻塞事件循环）
+    content = await asyncio.to_thread(collect_folder_content, folder_path, explain_base)
 
     if not content:
         return (folder_path, False)
 
-    # 生成目录树结构
-    tree_structure = generate_tree_structure(folder_path, explain_base)
+    # 生成目录树结构（同样是磁盘遍历，放到线程池）
+    tree_structure = await asyncio.to_thread(generate_tree_structure, folder_path, explain_base)
 
-    # 调用 Gemini（异步）
+    # 调用 Gemini（流式写入 README，成功后原子改名）
     # 对于根目录，使用更有意义的名称
     folder_display_name = explain_base.parent.name if str(folder_path) == "." else str(folder_path)
 
-    try:
-        readme_content = await ask_gemini_async(folder_display_name, content, tree_structure, client, model)
-    except Exception as e:
-        logger.error(f"❌ API 调用失败 {folder_path}: {e}")
-        return (folder_path, False)
-
-    # 保存结果
-    try:
-        readme_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(readme_path, "w", encoding="utf-8") as f:
-            f.write(f"# {folder_display_name}\n\n")
-            f.write(readme_content)
-        return (folder_path, True)
-    except Exception as e:
-        logger.error(f"❌ 保存失败 {folder_path}: {e}")
-        return (folder_path, False)
+    # 预估整条 prompt 的 token 数；塞不进上下文窗口的请求注定被拒，
+    # 与其浪费一次往返，不如先在本地用更紧的预算二次压缩
+    prompt_tokens = await asyncio.to_thread(
+        count_tokens, _build_prompt(folder_display_name, tree_structure, content)
+    )
+    overshoot = prompt_tokens + RESPONSE_MAX_TOKENS - MODEL_CONTEXT_LIMIT
+    if overshoot > 0:
+        tighter = max(10_000, MAX_TOKENS - overshoot)
+        logger.warning(
+            f"⚠️  {folder_path} 的 prompt 约 {prompt_tokens:,} tokens，超出上下文窗口，"
+            f"压缩到 {tighter:,} tokens 重试"
+        )
+        content = await asyncio.to_thread(
+            collect_folder_content, folder_path, explain_base, tighter
+        )
+        if not content:
+            return (folder_path, False)
+
+    ok = await ask_gemini_async(
+        folder_display_name, content, tree_structure, readme_path, client, model,
+        rpm_limiter, tpm_limiter,
+        cache_dir=explain_base / ".gemini_cache", refresh=force,
+        semaphore=semaphore,
+    )
+    if ok:
+        # 记录本次输入指纹，下次输入不变就零成本跳过
+        await asyncio.to_thread(
+            meta_path.write_text,
+            json.dumps({"model": model, "inputs_hash": inputs_hash}),
+            encoding="utf-8",
+        )
+    return (folder_path, ok)
 
 
 def find_all_folders(explain_base: Path, root_folder: Path) -> list[Path]:
@@ -355,19 +608,18 @@ def find_all_folders(explain_base: Path, root_folder: Path) -> list[Path]:
     if not explain_folder.exists():
         return []
 
-    folders = []
-
-    def walk(current_path: Path):
-        """递归遍历文件夹"""
-        for item in current_path.iterdir():
-            if item.is_dir():
-                rel_path = item.relative_to(explain_base)
-                folders.append(rel_path)
-                walk(item)
-
-    # 从根文件夹开始遍历
-    folders.append(root_folder)
-    walk(explain_folder)
+    # 从根文件夹开始迭代遍历（os.scandir 复用 d_type，不用逐项 stat）
+    folders = [root_folder]
+    base_str = str(explain_base)
+    pending = deque([str(explain_folder)])
+    while pending:
+        current = pending.popleft()
+        with os.scandir(current) as it:
+            for entry in it:
+                # 跳过隐藏目录（如 .gemini_cache）
+                if entry.is_dir(follow_symlinks=False) and not entry.name.startswith("."):
+                    folders.append(Path(os.path.relpath(entry.path, base_str)))
+                    pending.append(entry.path)
 
     # 按深度从深到浅排序（深度 = 路径中的 / 数量）
     folders.sort(key=lambda p: len(p.parts), reverse=True)
@@ -381,6 +633,8 @@ async def process_folders_batch(
     force: bool,
     model: str,
     max_workers: int = 8,
+    rpm: int = 0,
+    tpm: int = 0,
 ):
     """
     批量异步处理文件夹
@@ -391,6 +645,8 @@ async def process_folders_batch(
         force: 是否强制重新生成
         model: 使用的模型
         max_workers: 最大并发数（默认 8）
+        rpm: 每分钟最大请求数，0 表示不限流
+        tpm: 每分钟最大 prompt token 数，0 表示不限流
     """
     api_key = os.getenv("OPENAI_API_KEY")
     base_url = os.getenv("OPENAI_BASE_URL")
@@ -399,27 +655,49 @@ async def process_folders_batch(
         raise ValueError("需要设置环境变量 OPENAI_API_KEY")
 
     # 创建异步客户端
-    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+    # HTTP/2 让所有并发请求复用同一条 TCP/TLS 连接，避免逐请求握手
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_keepalive_connections=max_workers * 2,
+            max_connections=max_workers * 2,
+        ),
+    )
+    client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
 
     # 创建信号量控制并发数
     semaphore = asyncio.Semaphore(max_workers)
 
-    # 创建所有任务
-    tasks = [
-        generate_readme_async(
-            folder_path, explain_base, client, force, model, semaphore
-        )
-        for folder_path in folders
-    ]
+    # 可选的 RPM / TPM 限流器（共享给所有任务）
+    rpm_limiter = AsyncRateLimiter(max_rate=rpm) if rpm else None
+    tpm_limiter = AsyncRateLimiter(max_rate=tpm) if tpm else None
+
+    # 按深度分层：父目录的 collect_folder_content 要读子目录的 README.md，
+    # 必须等更深一层全部完成后才能开工；同层之间没有依赖，可以并发
+    levels: defaultdict[int, list[Path]] = defaultdict(list)
+    for folder_path in folders:
+        levels[len(folder_path.parts)].append(folder_path)
 
-    # 使用 tqdm 异步进度条
-    print(f"\n⚡ 使用 {max_workers} 个并发 worker 处理 {len(tasks)} 个文件夹")
+    print(f"\n⚡ 使用 {max_workers} 个并发 worker 处理 {len(folders)} 个文件夹（{len(levels)} 层）")
     print()
 
+    pbar = async_tqdm(total=len(folders), desc="生成 README", unit="folder")
+
+    async def run_one(folder_path: Path) -> tuple[Path, bool]:
+        result = await generate_readme_async(
+            folder_path, explain_base, client, force, model, semaphore,
+            rpm_limiter, tpm_limiter,
+        )
+        pbar.update(1)
+        return result
+
     results = []
-    for coro in async_tqdm.as_completed(tasks, desc="生成 README", unit="folder"):
-        result = await coro
-        results.append(result)
+    for depth in sorted(levels, reverse=True):
+        results.extend(
+            await asyncio.gather(*[run_one(p) for p in levels[depth]])
+        )
+    pbar.close()
+    await client.close()
 
     # 统计结果
     success_count = sum(1 for _, success in results if success)
@@ -435,6 +713,12 @@ async def main_async():
     parser.add_argument("--force", action="store_true", help="强制重新生成")
     parser.add_argument("--model", "-m", default="gemini-3-pro-preview", help="使用的模型")
     parser.add_argument("--workers", "-w", type=int, default=8, help="最大并发数（默认：8）")
+    parser.add_argument(
+        "--rpm", type=int, default=0, help="每分钟最大请求数，0 表示不限流（默认：0）"
+    )
+    parser.add_argument(
+        "--tpm", type=int, default=0, help="每分钟最大 prompt token 数，0 表示不限流（默认：0）"
+    )
 
     args = parser.parse_args()
 
@@ -469,6 +753,8 @@ async def main_async():
         args.force,
         args.model,
         args.workers,
+        args.rpm,
+        args.tpm,
     )
 
     print(f"\n🎉 完成！成功生成 {success_count}/{total_count} 个 README")
@@ -4,17 +4,37 @@ s5_website.py
 """
 
 import argparse
+import gzip
 import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 
 import markdown
 import sys
 
+try:
+    # Rust 实现的 JSON 序列化，大树结构比标准库 json 快 5-10 倍
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # mistune 的正则快路径比纯 Python 的 markdown 解析快约 3 倍
+    import mistune
+except ImportError:
+    mistune = None
+
 # Add parent directory to path to import utils
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from utils.utils import get_output_path
 
+# 静态资源（CSS/JS）放在脚本旁边的 assets/ 目录，生成时直接按字节复制
+ASSETS_DIR = Path(__file__).parent / "assets"
+
 
 def sanitize_dotfile_path(path: Path) -> Path:
     """
@@ -51,6 +71,15 @@ def build_tree_structure(repo_path: Path, subdir: Path, explain_base: Path) -> d
     repo_folder = repo_path / subdir
     explain_folder = explain_base / subdir
 
+    # 一次遍历把 explain 树收进内存集合，后面节点全走 O(1) 成员测试，
+    # 不再对每个 README.md / xxx.md 各做一次 stat 系统调用
+    explain_files: set[str] = set()
+    if explain_base.is_dir():
+        for dirpath, _dirnames, filenames in os.walk(explain_base):
+            rel_dir = os.path.relpath(dirpath, explain_base)
+            for filename in filenames:
+                explain_files.add(filename if rel_dir == "." else f"{rel_dir}/{filename}")
+
     def build_node(current_path: Path, current_explain: Path) -> dict[str, Any]:
         """递归构建节点"""
         # 根目录使用仓库名称，避免和子目录同名造成混淆
@@ -66,7 +95,7 @@ def build_tree_structure(repo_path: Path, subdir: Path, explain_base: Path) -> d
 
         # 检查是否有 README.md
         readme_path = current_explain / "README.md"
-        if readme_path.exists():
+        if str(readme_path.relative_to(explain_base)) in explain_files:
             # 对路径进行 dotfile 处理（.github -> _github）
             sanitized_readme = sanitize_dotfile_path(readme_path.relative_to(explain_base))
             node["readme"] = str(sanitized_readme)
@@ -105,7 +134,7 @@ def build_tree_structure(repo_path: Path, subdir: Path, explain_base: Path) -> d
             # 检查是否有对应的解读 .md 文件
             # 所有文件的解读都是 filename.ext.md（包括 .md 文件变成 filename.md.md）
             explain_md = current_explain / (file.name + ".md")
-            if explain_md.exists():
+            if str(explain_md.relative_to(explain_base)) in explain_files:
                 # 对路径进行 dotfile 处理（.github -> _github）
                 sanitized_explain = sanitize_dotfile_path(explain_md.relative_to(explain_base))
                 file_node["explanation"] = str(sanitized_explain)
@@ -131,43 +160,62 @@ def copy_source_files(repo_path: Path, subdir: Path, output_dir: Path):
 
     print(f"📦 复制源代码文件...")
 
-    # 收集所有需要复制的文件（包括根目录的文件）
+    # 收集所有需要复制的文件：os.walk 原地剪枝 .git，整棵子树直接跳过，
+    # 不再对每个路径做 ".git" 子串扫描，也不用 rglob 逐项 stat
     all_files = []
+    for dirpath, dirnames, filenames in os.walk(source_folder):
+        dirnames[:] = [d for d in dirnames if d != ".git"]
+        for filename in filenames:
+            all_files.append(Path(dirpath) / filename)
 
-    # 先添加根目录的文件
-    if source_folder.exists():
-        for item in source_folder.iterdir():
-            if item.name == ".git":
-                continue
-            if item.is_file():
-                all_files.append(item)
-
-    # 再添加子目录中的文件
-    for source_file in source_folder.rglob("*"):
-        if not source_file.is_file():
-            continue
-        if ".git" in str(source_file):
-            continue
-        all_files.append(source_file)
-
-    # 复制所有文件
+    # 先一次性算好所有 (src, dst) 对
+    pairs = []
     for source_file in all_files:
         rel_path = source_file.relative_to(source_folder)
         # 对路径进行 dotfile 处理（.github -> _github）
         sanitized_rel_path = sanitize_dotfile_path(rel_path)
-        dest_file = output_source / sanitized_rel_path
+        pairs.append((source_file, output_source / sanitized_rel_path))
 
+    def copy_one(pair: tuple[Path, Path]):
+        source_file, dest_file = pair
         dest_file.parent.mkdir(parents=True, exist_ok=True)
+        # 原样按字节复制：不做 decode/encode 往返，文本二进制统一处理
+        shutil.copyfile(source_file, dest_file)
 
-        # 尝试作为文本文件复制，如果失败则作为二进制文件复制
-        try:
-            dest_file.write_text(source_file.read_text(encoding="utf-8"), encoding="utf-8")
-        except (UnicodeDecodeError, UnicodeError):
-            dest_file.write_bytes(source_file.read_bytes())
+    # 线程池并发复制：文件 I/O 释放 GIL，几十个在途请求把单文件延迟隐藏掉，
+    # 小文件多的仓库在 HDD/网络盘上提升最明显
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        list(executor.map(copy_one, pairs, chunksize=64))
 
     print(f"✓ 源代码已复制到 {output_source}")
 
 
+# 每个 worker 进程只初始化一次 Markdown 实例，扩展加载成本摊到整个进程生命周期
+_md_converter = None
+
+
+def _init_markdown_worker():
+    global _md_converter
+    # 语法高亮交给页面本来就加载的 Prism.js，服务端不再跑 Pygments/codehilite
+    if mistune is not None:
+        _md_converter = mistune.create_markdown(plugins=["table"])
+    else:
+        _md_converter = markdown.Markdown(extensions=["fenced_code", "tables"])
+
+
+def _convert_one(task: tuple[Path, Path]):
+    """读取一个 .md 转成 HTML 写到目标位置（在 worker 进程中运行）"""
+    md_file, dest_html = task
+    dest_html.parent.mkdir(parents=True, exist_ok=True)
+    md_content = md_file.read_text(encoding="utf-8")
+    if mistune is not None:
+        html_content = _md_converter(md_content)
+    else:
+        _md_converter.reset()
+        html_content = _md_converter.convert(md_content)
+    dest_html.write_text(html_content, encoding="utf-8")
+
+
 def copy_explanation_files(explain_base: Path, subdir: Path, output_dir: Path):
     """
     复制解读 markdown 文件到输出目录
@@ -182,22 +230,31 @@ def copy_explanation_files(explain_base: Path, subdir: Path, output_dir: Path):
 
     print(f"📝 复制解读文件...")
 
-    for md_file in explain_folder.rglob("*.md"):
+    # os.walk 并剪枝隐藏目录（.gemini_cache 等缓存里的 .md 不该进网站）
+    md_files = []
+    for dirpath, dirnames, filenames in os.walk(explain_folder):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in filenames:
+            if filename.endswith(".md"):
+                md_files.append(Path(dirpath) / filename)
+
+    tasks = []
+    for md_file in md_files:
         rel_path = md_file.relative_to(explain_folder)
         # 对路径进行 dotfile 处理（.github -> _github）
         sanitized_rel_path = sanitize_dotfile_path(rel_path)
         dest_file = output_explain / sanitized_rel_path
-
-        dest_file.parent.mkdir(parents=True, exist_ok=True)
-
-        # 将 markdown 转换为 HTML
-        md_content = md_file.read_text(encoding="utf-8")
-        html_content = markdown.markdown(
-            md_content,
-            extensions=["fenced_code", "tables", "codehilite"]
-        )
-
-        dest_file.with_suffix(".html").write_text(html_content, encoding="utf-8")
+        tasks.append((md_file, dest_file.with_suffix(".html")))
+
+    # markdown 渲染是纯 CPU 的正则工作，受 GIL 限制线程帮不上忙，
+    # 用进程池把转换摊到所有核心上。main() 里这个函数跑在线程池 worker
+    # 线程上，多线程进程里 fork 有死锁风险（3.12 起直接报
+    # DeprecationWarning），所以显式用 spawn 启动 worker
+    with ProcessPoolExecutor(
+        initializer=_init_markdown_worker,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        list(pool.map(_convert_one, tasks, chunksize=16))
 
     print(f"✓ 解读文件已复制到 {output_explain}")
 
@@ -238,10 +295,6 @@ def generate_index_html(output_dir: Path, tree: dict[str, Any], repo_name: str):
         </main>
     </div>
 
-    <script>
-        // 文件树数据
-        const treeData = {json.dumps(tree, ensure_ascii=False, indent=2)};
-    </script>
     <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/prism.min.js"></script>
     <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/components/prism-python.min.js"></script>
     <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0/components/prism-json.min.js"></script>
@@ -254,542 +307,30 @@ def generate_index_html(output_dir: Path, tree: dict[str, Any], repo_name: str):
     index_file.write_text(html_content, encoding="utf-8")
     print(f"✓ 已生成 {index_file}")
 
+    # 树数据单独发布成 tree.json（紧凑编码，比 indent=2 小 ~30%），由
+    # app.js 异步 fetch，index.html 不再内联多 MB 的 <script>；顺带写一份
+    # 预压缩的 tree.json.gz，支持的静态托管可以直接下发
+    if orjson is not None:
+        tree_bytes = orjson.dumps(tree)
+    else:
+        tree_bytes = json.dumps(tree, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    tree_file = output_dir / "tree.json"
+    tree_file.write_bytes(tree_bytes)
+    (output_dir / "tree.json.gz").write_bytes(gzip.compress(tree_bytes))
+    print(f"✓ 已生成 {tree_file}")
 
-def generate_css(output_dir: Path):
-    """生成 CSS 样式文件"""
-    css_content = """/* 全局样式 */
-* {
-    margin: 0;
-    padding: 0;
-    box-sizing: border-box;
-}
-
-body {
-    font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
-    line-height: 1.6;
-    color: #333;
-    background: #f5f5f5;
-}
-
-/* 容器布局 */
-.container {
-    display: flex;
-    height: 100vh;
-    overflow: hidden;
-}
-
-/* 左侧导航栏 */
-.sidebar {
-    width: 320px;
-    background: #2c3e50;
-    color: #ecf0f1;
-    display: flex;
-    flex-direction: column;
-    box-shadow: 2px 0 5px rgba(0, 0, 0, 0.1);
-}
-
-.sidebar-header {
-    padding: 20px;
-    background: #1a252f;
-    border-bottom: 1px solid #34495e;
-}
-
-.sidebar-header h2 {
-    font-size: 1.4em;
-    font-weight: 600;
-}
-
-.tree-container {
-    flex: 1;
-    overflow-y: auto;
-    overflow-x: auto;
-    padding: 10px;
-    min-width: 0;
-}
-
-/* 文件树样式 */
-.tree-node {
-    margin: 2px 0;
-}
-
-.tree-label {
-    display: flex;
-    align-items: center;
-    padding: 6px 8px;
-    cursor: pointer;
-    border-radius: 4px;
-    transition: background 0.2s;
-    user-select: none;
-}
-
-.tree-label:hover {
-    background: #34495e;
-}
-
-.tree-label.active {
-    background: #3498db;
-    font-weight: 600;
-}
-
-.tree-icon {
-    margin-right: 6px;
-    font-size: 1em;
-    flex-shrink: 0;
-}
-
-.tree-toggle {
-    margin-right: 4px;
-    font-size: 0.75em;
-    width: 14px;
-    text-align: center;
-    flex-shrink: 0;
-}
-
-.tree-name {
-    white-space: nowrap;
-}
-
-.tree-children {
-    margin-left: 0;
-    display: none;
-}
-
-.tree-children.expanded {
-    display: block;
-}
-
-/* 右侧内容区 */
-.content {
-    flex: 1;
-    background: #fff;
-    overflow-y: auto;
-    padding: 40px;
-}
-
-.loading {
-    text-align: center;
-    padding: 40px;
-    color: #999;
-}
-
-/* 内容样式 */
-.content-header {
-    border-bottom: 2px solid #3498db;
-    padding-bottom: 15px;
-    margin-bottom: 30px;
-}
-
-.content-header h1 {
-    font-size: 2em;
-    color: #2c3e50;
-}
-
-.content-section {
-    margin-bottom: 40px;
-}
-
-.content-section h2 {
-    font-size: 1.5em;
-    color: #2c3e50;
-    margin-bottom: 15px;
-    border-left: 4px solid #3498db;
-    padding-left: 15px;
-}
-
-.content-section h3 {
-    font-size: 1.2em;
-    color: #34495e;
-    margin: 20px 0 10px 0;
-}
-
-/* 代码块样式 */
-pre {
-    background: #2d2d2d;
-    border-radius: 5px;
-    padding: 20px;
-    overflow-x: auto;
-    margin: 15px 0;
-}
-
-pre code {
-    font-family: "Fira Code", "Consolas", "Monaco", monospace;
-    font-size: 0.9em;
-    line-height: 1.5;
-}
-
-/* Markdown 内容样式 */
-.markdown-content {
-    line-height: 1.8;
-}
-
-.markdown-content p {
-    margin: 15px 0;
-}
-
-.markdown-content ul, .markdown-content ol {
-    margin: 15px 0;
-    padding-left: 30px;
-}
-
-.markdown-content li {
-    margin: 8px 0;
-}
-
-.markdown-content blockquote {
-    border-left: 4px solid #3498db;
-    padding-left: 20px;
-    margin: 20px 0;
-    color: #666;
-    font-style: italic;
-}
-
-/* Markdown 中的代码块样式 - 确保文字可见 */
-.markdown-content pre {
-    background: #2d2d2d;
-    border-radius: 5px;
-    padding: 20px;
-    overflow-x: auto;
-    margin: 15px 0;
-}
-
-.markdown-content pre code {
-    font-family: "Fira Code", "Consolas", "Monaco", monospace;
-    font-size: 0.9em;
-    line-height: 1.5;
-    color: #ccc !important;
-}
-
-/* codehilite 扩展生成的代码块 */
-.markdown-content .codehilite {
-    background: #2d2d2d;
-    border-radius: 5px;
-    margin: 15px 0;
-}
-
-.markdown-content .codehilite pre {
-    background: transparent;
-    margin: 0;
-    padding: 20px;
-}
-
-/* codehilite 中的所有 span 元素（语法高亮） */
-.markdown-content .codehilite pre span {
-    color: #ccc;
-}
-
-/* Markdown 中的行内代码 */
-.markdown-content code {
-    background: #f4f4f4;
-    padding: 2px 6px;
-    border-radius: 3px;
-    font-family: "Fira Code", "Consolas", "Monaco", monospace;
-    font-size: 0.9em;
-    color: #e74c3c;
-}
-
-/* 但是 pre 里的 code 不应该有行内代码的样式 */
-.markdown-content pre code {
-    background: transparent;
-    padding: 0;
-    border-radius: 0;
-    color: #ccc !important;
-}
-
-/* 滚动条样式 */
-::-webkit-scrollbar {
-    width: 10px;
-    height: 10px;
-}
-
-::-webkit-scrollbar-track {
-    background: #f1f1f1;
-}
-
-::-webkit-scrollbar-thumb {
-    background: #888;
-    border-radius: 5px;
-}
-
-::-webkit-scrollbar-thumb:hover {
-    background: #555;
-}
-
-/* 响应式设计 */
-@media (max-width: 768px) {
-    .sidebar {
-        width: 250px;
-    }
-
-    .content {
-        padding: 20px;
-    }
-}"""
 
+def generate_css(output_dir: Path):
+    """复制 CSS 样式文件"""
     css_file = output_dir / "styles.css"
-    css_file.write_text(css_content, encoding="utf-8")
+    shutil.copyfile(ASSETS_DIR / "styles.css", css_file)
     print(f"✓ 已生成 {css_file}")
 
 
 def generate_js(output_dir: Path):
-    """生成 JavaScript 文件"""
-    js_content = """// 应用状态
-let currentPath = null;
-
-// 初始化
-document.addEventListener('DOMContentLoaded', () => {
-    renderTree(treeData);
-    loadDefaultContent();
-});
-
-// 渲染文件树
-function renderTree(node) {
-    const container = document.getElementById('tree-container');
-    container.innerHTML = '';
-    container.appendChild(renderNode(node));
-}
-
-// 渲染单个节点
-function renderNode(node, level = 0) {
-    const div = document.createElement('div');
-    div.className = 'tree-node';
-    // Apply margin to the entire node instead of padding to label
-    div.style.marginLeft = `${level * 20}px`;
-
-    const label = document.createElement('div');
-    label.className = 'tree-label';
-
-    // 切换图标
-    if (node.type === 'folder' && node.children && node.children.length > 0) {
-        const toggle = document.createElement('span');
-        toggle.className = 'tree-toggle';
-        toggle.textContent = '▶';
-        label.appendChild(toggle);
-    } else {
-        const spacer = document.createElement('span');
-        spacer.className = 'tree-toggle';
-        spacer.textContent = ' ';
-        label.appendChild(spacer);
-    }
-
-    // 文件/文件夹图标
-    const icon = document.createElement('span');
-    icon.className = 'tree-icon';
-    icon.textContent = node.type === 'folder' ? '📁' : '📄';
-    label.appendChild(icon);
-
-    // 名称
-    const name = document.createElement('span');
-    name.className = 'tree-name';
-    name.textContent = node.name;
-    label.appendChild(name);
-
-    // 点击事件
-    label.addEventListener('click', (e) => {
-        e.stopPropagation();
-
-        // 处理文件夹折叠/展开
-        if (node.type === 'folder' && node.children && node.children.length > 0) {
-            const children = div.querySelector('.tree-children');
-            const toggle = label.querySelector('.tree-toggle');
-            if (children.classList.contains('expanded')) {
-                children.classList.remove('expanded');
-                toggle.textContent = '▶';
-            } else {
-                children.classList.add('expanded');
-                toggle.textContent = '▼';
-            }
-        }
-
-        // 加载内容
-        loadContent(node);
-
-        // 更新激活状态
-        document.querySelectorAll('.tree-label').forEach(el => el.classList.remove('active'));
-        label.classList.add('active');
-    });
-
-    div.appendChild(label);
-
-    // 递归渲染子节点
-    if (node.children && node.children.length > 0) {
-        const children = document.createElement('div');
-        children.className = 'tree-children';
-
-        node.children.forEach(child => {
-            children.appendChild(renderNode(child, level + 1));
-        });
-
-        div.appendChild(children);
-    }
-
-    return div;
-}
-
-// 加载默认内容（顶层 README）
-function loadDefaultContent() {
-    if (treeData.readme) {
-        loadReadme(treeData.readme, treeData.name);
-    } else {
-        document.getElementById('content-area').innerHTML = `
-            <div class="content-header">
-                <h1>${treeData.name}</h1>
-            </div>
-            <div class="markdown-content">
-                <p style="color: #666; padding: 20px; background: #f9f9f9; border-radius: 5px; border-left: 4px solid #3498db;">
-                    欢迎查看代码解读！请从左侧导航栏选择文件或文件夹。
-                </p>
-            </div>
-        `;
-    }
-}
-
-// 加载内容
-function loadContent(node) {
-    currentPath = node.path;
-
-    if (node.type === 'folder') {
-        // 加载文件夹的 README
-        if (node.readme) {
-            loadReadme(node.readme, node.name);
-        } else {
-            document.getElementById('content-area').innerHTML = `
-                <div class="content-header">
-                    <h1>📁 ${node.name}</h1>
-                </div>
-                <div class="markdown-content">
-                    <p style="color: #666; padding: 20px; background: #f9f9f9; border-radius: 5px; border-left: 4px solid #e67e22;">
-                        该文件夹暂无说明文档。
-                    </p>
-                </div>
-            `;
-        }
-    } else {
-        // 加载文件的解读和源代码
-        loadFile(node);
-    }
-}
-
-// 加载 README
-async function loadReadme(readmePath, folderName) {
-    try {
-        // Convert .md to .html
-        let htmlPath = readmePath;
-        if (htmlPath.endsWith('.md')) {
-            htmlPath = htmlPath.slice(0, -3) + '.html';
-        }
-        // Encode path components to handle special characters and dots
-        const encodedPath = htmlPath.split('/').map(encodeURIComponent).join('/');
-        const response = await fetch(`explanations/${encodedPath}`);
-
-        // Check if fetch was successful
-        if (!response.ok) {
-            throw new Error(`HTTP ${response.status}`);
-        }
-
-        const html = await response.text();
-
-        document.getElementById('content-area').innerHTML = `
-            <div class="content-header">
-                <h1>📁 ${folderName}</h1>
-            </div>
-            <div class="markdown-content">
-                ${html}
-            </div>
-        `;
-    } catch (error) {
-        // Show consistent error message with same layout as normal content
-        document.getElementById('content-area').innerHTML = `
-            <div class="content-header">
-                <h1>📁 ${folderName}</h1>
-            </div>
-            <div class="markdown-content">
-                <p style="color: #666; padding: 20px; background: #f9f9f9; border-radius: 5px; border-left: 4px solid #e67e22;">
-                    该文件夹暂无说明文档。
-                </p>
-            </div>
-        `;
-    }
-}
-
-// 加载文件
-async function loadFile(node) {
-    const contentArea = document.getElementById('content-area');
-    contentArea.innerHTML = '<div class="loading">加载中...</div>';
-
-    try {
-        let html = `
-            <div class="content-header">
-                <h1>📄 ${node.name}</h1>
-                <p style="color: #666; margin-top: 10px;">${node.path}</p>
-            </div>
-        `;
-
-        // 加载解读
-        if (node.explanation) {
-            // Convert .md to .html, handling both regular files (.ext.md -> .ext.html)
-            // and markdown files (.md -> .html)
-            let htmlPath = node.explanation;
-            if (htmlPath.endsWith('.md')) {
-                htmlPath = htmlPath.slice(0, -3) + '.html';
-            }
-            // Encode path components to handle special characters and dots
-            const encodedPath = htmlPath.split('/').map(encodeURIComponent).join('/');
-            const response = await fetch(`explanations/${encodedPath}`);
-            const explanationHtml = await response.text();
-
-            html += `
-                <div class="content-section">
-                    <h2>📖 AI 解读</h2>
-                    <div class="markdown-content">
-                        ${explanationHtml}
-                    </div>
-                </div>
-            `;
-        }
-
-        // 加载源代码
-        if (node.source) {
-            // Encode path components to handle special characters and dots
-            const encodedSource = node.source.split('/').map(encodeURIComponent).join('/');
-            const sourceResponse = await fetch(`sources/${encodedSource}`);
-            const sourceCode = await sourceResponse.text();
-
-            html += `
-                <div class="content-section">
-                    <h2>💻 源代码</h2>
-                    <pre><code class="language-python">${escapeHtml(sourceCode)}</code></pre>
-                </div>
-            `;
-        }
-
-        contentArea.innerHTML = html;
-
-        // 重新应用 Prism 语法高亮
-        Prism.highlightAll();
-    } catch (error) {
-        contentArea.innerHTML = `
-            <div class="content-header">
-                <h1>📄 ${node.name}</h1>
-                <p style="color: #666; margin-top: 10px;">${node.path}</p>
-            </div>
-            <div class="markdown-content">
-                <p style="color: #666; padding: 20px; background: #fff5f5; border-radius: 5px; border-left: 4px solid #e74c3c;">
-                    加载失败：${error.message}
-                </p>
-            </div>
-        `;
-    }
-}
-
-// 转义 HTML
-function escapeHtml(text) {
-    const div = document.createElement('div');
-    div.textContent = text;
-    return div.innerHTML;
-}"""
-
+    """复制 JavaScript 文件"""
     js_file = output_dir / "app.js"
-    js_file.write_text(js_content, encoding="utf-8")
+    shutil.copyfile(ASSETS_DIR / "app.js", js_file)
     print(f"✓ 已生成 {js_file}")
 
 
@@ -827,19 +368,22 @@ def main():
     print("✓ 文件树构建完成")
     print()
 
-    # 复制源代码文件
-    copy_source_files(repo_path, subdir, output_dir)
-    print()
-
-    # 复制解读文件
-    copy_explanation_files(explain_base, subdir, output_dir)
+    # 各阶段写的是互不相交的输出子目录，线程池并发执行，
+    # 墙钟时间 ≈ 最慢阶段而不是各阶段之和
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [
+            pool.submit(copy_source_files, repo_path, subdir, output_dir),
+            pool.submit(copy_explanation_files, explain_base, subdir, output_dir),
+            pool.submit(generate_css, output_dir),
+            pool.submit(generate_js, output_dir),
+        ]
+        for future in futures:
+            future.result()
     print()
 
-    # 生成 HTML/CSS/JS
+    # index.html / tree.json 依赖文件树，放在最后单独生成
     print("🎨 生成网站文件...")
     generate_index_html(output_dir, tree, repo_name)
-    generate_css(output_dir)
-    generate_js(output_dir)
     print()
 
     print(f"🎉 完成！网站已生成到: {output_dir}")
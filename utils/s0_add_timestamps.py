@@ -4,6 +4,8 @@ s0_add_timestamps.py
 """
 
 import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
@@ -113,11 +115,16 @@ def main():
 
     print("🚀 开始处理 output 目录...\n")
 
+    # 并行读取各仓库的 commit 日期（每个 worker 独立打开仓库）
+    # 重命名仍然串行执行，避免文件系统竞争
+    with ProcessPoolExecutor(max_workers=min(len(repos), os.cpu_count())) as executor:
+        dates = dict(zip(repos, executor.map(get_commit_date, repos.values())))
+
     for repo_name, repo_path in repos.items():
         print(f"📦 处理 {repo_name}...")
 
         # 获取 commit 日期
-        commit_date = get_commit_date(repo_path)
+        commit_date = dates[repo_name]
         if commit_date is None:
             print(f"⏭️  跳过 {repo_name}\n")
             continue
@@ -8,74 +8,256 @@ s1_repo_heatmap_tree.py
 """
 
 import argparse
-from collections import defaultdict
+import io
+import json
+import multiprocessing
+import os
+import subprocess
+from collections import Counter
 from pathlib import Path
 
 import git
+import matplotlib
+
+matplotlib.use("Agg")  # 纯离屏渲染，不加载任何 GUI 后端
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from matplotlib.collections import PatchCollection
 from matplotlib.colors import LinearSegmentedColormap
 import numpy as np
 
-from utils import get_output_base
+from utils import get_output_base, git_command, git_env
+
+
+# 颜色映射（白色 -> 黄色 -> 红色），matplotlib 和 HTML 两种渲染共用
+HEAT_COLORS = ["#f0f0f0", "#fff7bc", "#fee391", "#fec44f", "#fe9929", "#ec7014", "#cc4c02", "#8c2d04"]
+
+
+def _diff_worker(args: tuple[str, list[str]]) -> Counter:
+    """
+    GitPython 回退路径的子进程 worker
+
+    每个 worker 打开自己的仓库句柄，统计一段 commit 区间内的文件修改次数。
+    模块级函数才能被 multiprocessing pickle。
+    """
+    repo_path, shas = args
+    repo = git.Repo(repo_path)
+    counter = Counter()
+    for sha in shas:
+        try:
+            commit = repo.commit(sha)
+            if commit.parents:
+                for diff in commit.parents[0].diff(commit):
+                    file_path = diff.a_path or diff.b_path
+                    if file_path:
+                        counter[file_path] += 1
+        except Exception:
+            continue
+    return counter
 
 
 class RepoTreeHeatmap:
-    def __init__(self, repo_path: str, max_depth: int = 5, max_files_per_dir: int = 20):
+    def __init__(
+        self,
+        repo_path: str,
+        max_depth: int = 5,
+        max_files_per_dir: int = 20,
+        max_commits: int | None = 5000,
+        since: str | None = None,
+    ):
         self.repo_path = Path(repo_path)
         self.repo = git.Repo(repo_path)
         self.max_depth = max_depth
         self.max_files_per_dir = max_files_per_dir
-        self.file_change_count = defaultdict(int)
+        self.max_commits = max_commits or None  # 0 表示不限制
+        self.since = since
+        self.file_change_count = Counter()
         self.total_lines = 0  # 记录总行数，用于计算高度
 
     def collect_file_changes(self):
-        """统计每个文件在 git 历史中被修改的次数"""
+        """统计每个文件在 git 历史中被修改的次数（单次 git log 流式统计）"""
         print("📊 正在分析 git 历史...")
 
-        for commit in self.repo.iter_commits():
-            try:
-                if commit.parents:
-                    diffs = commit.parents[0].diff(commit)
-                    for diff in diffs:
-                        # 获取文件路径
-                        file_path = diff.a_path or diff.b_path
-                        if file_path:
-                            self.file_change_count[file_path] += 1
-            except Exception as e:
-                continue
+        try:
+            self._collect_with_git_log()
+        except FileNotFoundError:
+            # 环境里没有 git 可执行文件时回退到 GitPython 多进程统计
+            self._collect_with_gitpython()
 
         print(f"✓ 分析完成，共 {len(self.file_change_count)} 个文件有修改记录")
 
+    def _collect_with_git_log(self):
+        """主路径：一次 git log 调用输出所有 commit 修改过的文件名，逐行流式统计
+
+        统计范围固定为 HEAD 的祖先，和缓存的增量更新（last_sha..HEAD）
+        用同一条 rev 范围——带 --all 的话多分支仓库上两条路径算出来的
+        结果会不一致。
+        """
+        argv = git_command(
+            str(self.repo_path), "log", "HEAD",
+            "--pretty=format:", "--name-only", "--no-renames",
+        )
+        if self.max_commits:
+            # git rev-list --count 很便宜，用来提示实际限制了多少
+            total = subprocess.run(
+                git_command(str(self.repo_path), "rev-list", "--count", "HEAD"),
+                capture_output=True,
+                text=True,
+                env=git_env(),
+            ).stdout.strip()
+            if total:
+                print(f"   （只统计最近 {self.max_commits} 个 commit，总共 {total} 个）")
+            argv += ["-n", str(self.max_commits)]
+        if self.since:
+            argv += [f"--since={self.since}"]
+
+        proc = subprocess.Popen(
+            argv,
+            stdout=subprocess.PIPE,
+            text=True,
+            env=git_env(),
+        )
+        # 按批喂给 Counter.update（C 实现），比逐行 += 1 快数倍
+        buf = []
+        for line in proc.stdout:
+            file_path = line.rstrip()
+            if file_path:
+                buf.append(file_path)
+                if len(buf) >= 10000:
+                    self.file_change_count.update(buf)
+                    buf.clear()
+        if buf:
+            self.file_change_count.update(buf)
+        proc.wait()
+
+    def _collect_with_gitpython(self):
+        """回退路径：按 CPU 数切分 commit 区间，用进程池并行跑 GitPython diff"""
+        print("⚠️  git 命令不可用，回退到 GitPython 多进程统计")
+
+        shas = self.repo.git.rev_list("HEAD").split()
+        if self.max_commits:
+            shas = shas[: self.max_commits]
+        if not shas:
+            return
+
+        n_workers = min(multiprocessing.cpu_count(), len(shas))
+        chunk_size = (len(shas) + n_workers - 1) // n_workers
+        chunks = [
+            (str(self.repo_path), shas[i:i + chunk_size])
+            for i in range(0, len(shas), chunk_size)
+        ]
+
+        with multiprocessing.Pool(len(chunks)) as pool:
+            for counter in pool.map(_diff_worker, chunks):
+                self.file_change_count.update(counter)
+
+    def _load_or_compute_changes(self):
+        """优先从磁盘缓存加载修改计数（按 HEAD SHA 命名），HEAD 未变时跳过全量分析"""
+        try:
+            head = self.repo.head.commit.hexsha
+        except Exception:
+            self.collect_file_changes()
+            return
+
+        # 限制了统计范围时，限制参数也要进缓存名，避免不同范围互相污染
+        suffix = ""
+        if self.max_commits:
+            suffix += f"_n{self.max_commits}"
+        if self.since:
+            suffix += f"_since{self.since}"
+
+        cache_dir = Path(get_output_base(str(self.repo_path)))
+        cache_path = cache_dir / f".heatmap_cache_{head}{suffix}.json"
+
+        # HEAD 未变：直接加载缓存
+        if cache_path.exists():
+            print(f"⚡ 命中缓存: {cache_path}")
+            self.file_change_count = Counter(
+                json.loads(cache_path.read_text(encoding="utf-8"))
+            )
+            return
+
+        # HEAD 变了但有旧缓存：只增量统计 last_sha..HEAD 的新 commit
+        # （限制了统计范围时增量合并不成立，直接重新统计）
+        old_caches = sorted(cache_dir.glob(".heatmap_cache_*.json")) if cache_dir.exists() else []
+        # 只有全量缓存（文件名不带 _nXXX/_sinceXXX 后缀）能当增量合并的底座：
+        # 限过范围的旧缓存本身就不完整，往上补 last_sha..HEAD 会悄悄丢掉大半历史
+        full_caches = [
+            p for p in old_caches
+            if "_" not in p.name[len(".heatmap_cache_"):-len(".json")]
+        ]
+        loaded = False
+        if full_caches and not suffix:
+            old_path = full_caches[0]
+            last_sha = old_path.name[len(".heatmap_cache_"):-len(".json")]
+            proc = subprocess.run(
+                git_command(
+                    str(self.repo_path), "log",
+                    f"{last_sha}..HEAD",
+                    "--pretty=format:", "--name-only", "--no-renames",
+                ),
+                capture_output=True,
+                text=True,
+                env=git_env(),
+            )
+            if proc.returncode == 0:
+                print(f"⚡ 增量更新缓存: {last_sha[:8]}..HEAD")
+                self.file_change_count = Counter(
+                    json.loads(old_path.read_text(encoding="utf-8"))
+                )
+                self.file_change_count.update(
+                    line for line in proc.stdout.splitlines() if line
+                )
+                loaded = True
+
+        if not loaded:
+            self.collect_file_changes()
+
+        # 写入新缓存并清理旧缓存
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(
+            json.dumps(dict(self.file_change_count)), encoding="utf-8"
+        )
+        for old_path in old_caches:
+            old_path.unlink(missing_ok=True)
+
+    def _walk(self, path, depth: int = 1):
+        """基于 os.scandir 的递归遍历（目录级剪枝 .git 和超深目录，DirEntry 缓存 stat）"""
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name == ".git":
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if depth < self.max_depth:
+                        yield from self._walk(entry.path, depth + 1)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path
+
     def build_tree_structure(self):
         """构建树状结构（限制深度和每层文件数）"""
         print("🌲 正在构建树状结构...")
 
         tree = {}
+        root = str(self.repo_path)
 
         # 只包含当前存在的文件
-        for file_path in self.repo_path.rglob("*"):
-            if file_path.is_file() and ".git" not in str(file_path):
-                rel_path = file_path.relative_to(self.repo_path)
-                parts = rel_path.parts
-
-                # 检查深度
-                if len(parts) > self.max_depth:
-                    continue
-
-                # 构建树
-                current = tree
-                for i, part in enumerate(parts):
-                    if i == len(parts) - 1:  # 文件
-                        if "files" not in current:
-                            current["files"] = []
-                        current["files"].append(part)
-                    else:  # 目录
-                        if "dirs" not in current:
-                            current["dirs"] = {}
-                        if part not in current["dirs"]:
-                            current["dirs"][part] = {}
-                        current = current["dirs"][part]
+        for file_path in self._walk(root):
+            rel_path = os.path.relpath(file_path, root)
+            parts = rel_path.split(os.sep)
+
+            # 构建树
+            current = tree
+            for i, part in enumerate(parts):
+                if i == len(parts) - 1:  # 文件
+                    if "files" not in current:
+                        current["files"] = []
+                    current["files"].append(part)
+                else:  # 目录
+                    if "dirs" not in current:
+                        current["dirs"] = {}
+                    if part not in current["dirs"]:
+                        current["dirs"][part] = {}
+                    current = current["dirs"][part]
 
         # 限制每个目录的文件数量
         self._limit_files(tree)
@@ -118,6 +300,12 @@ class RepoTreeHeatmap:
         height = max(self.total_lines * 0.4, 10)  # 最小 10 英寸
         width = 20  # 固定宽度
 
+        # 上限 400 英寸：更高的画布在 dpi=96 下也要分配 GB 级内存，
+        # 超出时建议用 --max-depth/--max-files 缩小树规模
+        if height > 400:
+            print(f"⚠️  图表高度 {height:.0f} 英寸超出上限，截断到 400 英寸")
+            height = 400
+
         print(f"📏 计算图表尺寸: {self.total_lines} 行 -> {width}x{height} 英寸")
         return (width, height)
 
@@ -150,20 +338,41 @@ class RepoTreeHeatmap:
 
         # 计算 figure size
         fig_size = self.calculate_figure_size(tree)
-        fig, ax = plt.subplots(figsize=fig_size, dpi=100)
+        fig, ax = plt.subplots(figsize=fig_size, dpi=96)
+
+        # 文字（zorder 3）保持矢量，背景色块栅格化
+        ax.set_rasterization_zorder(2)
 
-        # 设置颜色映射（白色 -> 黄色 -> 红色）
-        colors = ["#f0f0f0", "#fff7bc", "#fee391", "#fec44f", "#fe9929", "#ec7014", "#cc4c02", "#8c2d04"]
+        # 设置颜色映射
         n_bins = 100
-        cmap = LinearSegmentedColormap.from_list("heat", colors, N=n_bins)
+        cmap = LinearSegmentedColormap.from_list("heat", HEAT_COLORS, N=n_bins)
+
+        # 预计算 256 级颜色查找表，绘制时直接整数索引，
+        # 避免每个文件都走一遍 matplotlib 的 cmap 调用
+        self._lut = cmap(np.linspace(0, 1, 256))
 
         # 获取最大修改次数用于归一化
         max_changes = max(self.file_change_count.values()) if self.file_change_count else 1
 
-        # 绘制树
+        # 绘制树（文件背景矩形先收集，最后一次性批量添加）
+        self._rects = []
+        self._facecolors = []
         y_pos = [0]  # 使用列表以便在递归中修改
         self._draw_node(ax, tree, x=0, y_pos=y_pos, cmap=cmap, max_changes=max_changes)
 
+        # 一个 PatchCollection 代替逐文件的 FancyBboxPatch，
+        # 避免为每个文件构造一个完整的 artist
+        if self._rects:
+            ax.add_collection(
+                PatchCollection(
+                    self._rects,
+                    facecolors=self._facecolors,
+                    edgecolors="#888888",
+                    linewidths=0.5,
+                    alpha=0.9,
+                )
+            )
+
         # 设置图表
         ax.set_xlim(-0.5, 12)
         ax.set_ylim(y_pos[0] - 1, 1)
@@ -186,7 +395,7 @@ class RepoTreeHeatmap:
         output_path = Path(output_path)
         output_path.parent.mkdir(parents=True, exist_ok=True)
         plt.tight_layout()
-        plt.savefig(output_path, bbox_inches="tight", dpi=150)
+        plt.savefig(output_path, bbox_inches="tight", dpi=96)
         print(f"✓ 图表已保存到: {output_path}")
 
         plt.close()
@@ -239,28 +448,28 @@ class RepoTreeHeatmap:
                 heat = self.file_change_count.get(full_path, 0)
                 normalized_heat = heat / max_changes if max_changes > 0 else 0
 
-                # 获取颜色
-                color = cmap(normalized_heat)
-
-                # 绘制文件（带背景色）
-                bbox = dict(
-                    boxstyle="round,pad=0.25",
-                    facecolor=color,
-                    edgecolor="#888888",
-                    linewidth=0.5,
-                    alpha=0.9
-                )
+                # 获取颜色（查表代替 cmap 调用）
+                color = tuple(self._lut[min(255, int(normalized_heat * 255))])
 
                 # 截断过长的文件名
                 display_name = file_name if len(file_name) <= 40 else file_name[:37] + "..."
+                label = f"{display_name} ({heat})"
+
+                # 背景矩形先收集，宽度按 monospace 字符数估算（数据坐标）
+                char_width = 0.11
+                self._rects.append(
+                    mpatches.Rectangle(
+                        (x - 0.05, y - 0.22), char_width * len(label) + 0.1, 0.44
+                    )
+                )
+                self._facecolors.append(color)
 
                 ax.text(
                     x,
                     y,
-                    f"{display_name} ({heat})",
+                    label,
                     fontsize=7,
                     va="center",
-                    bbox=bbox,
                     family="monospace",
                 )
 
@@ -278,12 +487,113 @@ class RepoTreeHeatmap:
                 family="monospace",
             )
 
-    def run(self, output_path: str = "output/s1_repo_heatmap.png"):
+    @staticmethod
+    def _build_heat_lut():
+        """纯 Python 的 256 级热度->RGB 查找表（线性插值，不依赖 matplotlib）"""
+        stops = [tuple(int(c[i:i + 2], 16) for i in (1, 3, 5)) for c in HEAT_COLORS]
+        lut = []
+        for i in range(256):
+            pos = i / 255 * (len(stops) - 1)
+            low = int(pos)
+            high = min(low + 1, len(stops) - 1)
+            frac = pos - low
+            lut.append(
+                tuple(
+                    round(stops[low][ch] + (stops[high][ch] - stops[low][ch]) * frac)
+                    for ch in range(3)
+                )
+            )
+        return lut
+
+    def render_html(self, tree, output_path: str):
+        """渲染 HTML 热力图（完全绕过 matplotlib，生成快且可在浏览器中滚动查看）"""
+        print("🎨 正在生成 HTML 热力图...")
+
+        lut = self._build_heat_lut()
+        max_changes = max(self.file_change_count.values()) if self.file_change_count else 1
+
+        out = io.StringIO()
+        out.write(
+            "<!DOCTYPE html>\n<html>\n<head>\n<meta charset='utf-8'>\n"
+            f"<title>Git Repo Heatmap: {self.repo_path.name}</title>\n"
+            "<style>\n"
+            "body { font-family: monospace; font-size: 13px; margin: 20px; }\n"
+            ".dir { font-weight: bold; color: #2166ac; margin: 3px 0; }\n"
+            ".file { display: inline-block; padding: 1px 6px; margin: 1px 0;"
+            " border: 1px solid #888; border-radius: 3px; }\n"
+            ".more { color: #999; font-style: italic; }\n"
+            "</style>\n</head>\n<body>\n"
+            f"<h2>Git Repo Heatmap: {self.repo_path.name}</h2>\n"
+            f"<p>(max_depth={self.max_depth}, max_files_per_dir={self.max_files_per_dir},"
+            f" max_changes={max_changes})</p>\n"
+        )
+        self._render_html_node(out, tree, lut, max_changes, parent_path="", depth=0)
+        out.write("</body>\n</html>\n")
+
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(out.getvalue(), encoding="utf-8")
+        print(f"✓ 图表已保存到: {output_path}")
+
+    def _render_html_node(self, out, tree, lut, max_changes, parent_path, depth):
+        """递归输出 HTML 节点"""
+        indent = f"margin-left:{depth * 1.5}em"
+
+        if "dirs" in tree:
+            for dir_name, subtree in sorted(tree["dirs"].items()):
+                out.write(f"<div class='dir' style='{indent}'>[{dir_name}/]</div>\n")
+                new_path = f"{parent_path}/{dir_name}" if parent_path else dir_name
+                self._render_html_node(out, subtree, lut, max_changes, new_path, depth + 1)
+
+        if "files" in tree:
+            for file_name in tree["files"]:
+                full_path = f"{parent_path}/{file_name}" if parent_path else file_name
+                heat = self.file_change_count.get(full_path, 0)
+                normalized = heat / max_changes if max_changes > 0 else 0
+                r, g, b = lut[min(255, int(normalized * 255))]
+                out.write(
+                    f"<div style='{indent}'>"
+                    f"<span class='file' style='background:rgb({r},{g},{b})'>"
+                    f"{file_name} ({heat})</span></div>\n"
+                )
+
+        if "truncated" in tree and tree["truncated"] > 0:
+            out.write(
+                f"<div class='more' style='{indent}'>... (+{tree['truncated']} more files)</div>\n"
+            )
+
+    def _ensure_commit_graph(self):
+        """
+        确保仓库有 commit-graph 文件
+
+        git 的 commit-graph（带 --changed-paths Bloom filter）能把遍历
+        commit 历史加速一个数量级，后续的 git log 都会自动受益。
+        只在文件不存在时写一次，写入失败也不影响主流程。
+        """
+        graph_file = self.repo_path / ".git" / "objects" / "info" / "commit-graph"
+        if graph_file.exists():
+            return
+        print("📈 首次运行，写入 commit-graph 加速后续分析...")
+        subprocess.run(
+            git_command(
+                str(self.repo_path),
+                "commit-graph", "write", "--reachable", "--changed-paths",
+            ),
+            check=False,
+            stderr=subprocess.DEVNULL,
+            env=git_env(),
+        )
+
+    def run(self, output_path: str = "output/s1_repo_heatmap.png", fmt: str = "png"):
         """运行完整流程"""
         print(f"🚀 开始分析仓库: {self.repo_path}")
-        self.collect_file_changes()
+        self._ensure_commit_graph()
+        self._load_or_compute_changes()
         tree = self.build_tree_structure()
-        self.plot_tree(tree, output_path)
+        if fmt == "html":
+            self.render_html(tree, output_path)
+        else:
+            self.plot_tree(tree, output_path)
         print("🎉 完成！")
 
 
@@ -297,18 +607,32 @@ def main():
         "--max-files", type=int, default=20, help="每个目录最多显示的文件数 (默认: 20)"
     )
     parser.add_argument(
-        "--output", "-o", help="输出文件路径（默认：output/<repo_name>/s1_heatmap.png）"
+        "--max-commits", type=int, default=5000,
+        help="最多统计最近 N 个 commit，0 表示不限制 (默认: 5000)",
+    )
+    parser.add_argument(
+        "--since", help="只统计某日期之后的 commit（如 2024-01-01 或 '1 year ago'）"
+    )
+    parser.add_argument(
+        "--format", choices=["png", "html"], default="png",
+        help="输出格式：png（matplotlib）或 html（纯文本渲染，大仓库快得多）",
+    )
+    parser.add_argument(
+        "--output", "-o", help="输出文件路径（默认：output/<repo_name>/s1_heatmap.<format>）"
     )
 
     args = parser.parse_args()
 
-    # 默认输出路径：output/<repo_name>/s1_heatmap.png
+    # 默认输出路径：output/<repo_name>/s1_heatmap.<format>
     if args.output is None:
         output_base = get_output_base(args.repo_path)
-        args.output = f"{output_base}/s1_heatmap.png"
+        args.output = f"{output_base}/s1_heatmap.{args.format}"
 
-    heatmap = RepoTreeHeatmap(args.repo_path, args.max_depth, args.max_files)
-    heatmap.run(args.output)
+    heatmap = RepoTreeHeatmap(
+        args.repo_path, args.max_depth, args.max_files,
+        max_commits=args.max_commits, since=args.since,
+    )
+    heatmap.run(args.output, args.format)
 
 
 if __name__ == "__main__":
@@ -4,35 +4,79 @@ s2_analyze_stats.py
 """
 
 import argparse
-from collections import defaultdict
-from pathlib import Path
+import json
+import mmap
+import os
+import stat
+from collections import Counter
 
 import git
 import numpy as np
-import tiktoken
 
+from utils import get_tokenizer
 
-# 初始化 tokenizer（使用 o200k_base，对应 GPT-5/Gemini 等新模型）
-tokenizer = tiktoken.get_encoding("o200k_base")
+# 初始化 tokenizer（使用 o200k_base，对应 GPT-5/Gemini 等新模型；进程内共享）
+tokenizer = get_tokenizer()
 
+# 超过这个大小的文件读取时走 mmap（小文件 mmap 的建立开销不划算）
+_MMAP_THRESHOLD = 1 << 20  # 1 MiB
 
-def count_tokens(file_path: Path) -> int:
+# token 数量的磁盘缓存：{绝对路径: [mtime, size, tokens]}
+TOKEN_CACHE_PATH = ".token_cache.json"
+
+
+def _looks_textual(path: str) -> bool:
     """
-    使用 tiktoken 计算文件的实际 token 数量
+    用前 512 字节判断文件是否像文本（git 同款启发式）
+
+    含 NUL 字节或非可打印字节超过 ~30% 就当二进制处理，
+    免得把整个 PNG/wheel 读进内存再靠解码异常兜底。
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(512)
+    except OSError:
+        return False
+    if not head:
+        return True
+    if b"\x00" in head:
+        return False
+    printable = sum(1 for b in head if b in (9, 10, 13) or 32 <= b < 127 or b >= 128)
+    return printable / len(head) > 0.7
+
+
+def count_tokens_batch(paths: list[str]) -> list[int]:
+    """
+    批量计算文件的实际 token 数量
+
+    encode_ordinary_batch 在 Rust 侧释放 GIL、用线程池并行编码，
+    比逐文件调 encode 快得多；二进制和读不了的文件记 0 个 token。
 
     Args:
-        file_path: 文件路径
+        paths: 文件路径列表
 
     Returns:
-        token 数量
+        与 paths 对应的 token 数量列表
     """
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            tokens = tokenizer.encode(content)
-            return len(tokens)
-    except:
-        return 0
+    contents = []
+    for path in paths:
+        if not _looks_textual(path):
+            contents.append("")
+            continue
+        try:
+            if os.path.getsize(path) >= _MMAP_THRESHOLD:
+                # 大文件直接在页缓存上解码，不经过中间 bytes 缓冲；
+                # errors="replace" 避免个别坏字节让整个大文件计 0
+                with open(path, "rb") as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        contents.append(str(mm[:], "utf-8", "replace"))
+            else:
+                with open(path, encoding="utf-8") as f:
+                    contents.append(f.read())
+        except (OSError, UnicodeDecodeError):
+            contents.append("")
+    token_lists = tokenizer.encode_ordinary_batch(contents, num_threads=os.cpu_count())
+    return [len(tokens) for tokens in token_lists]
 
 
 def analyze_repo_stats(repo_path: str, subdir: str):
@@ -44,35 +88,63 @@ def analyze_repo_stats(repo_path: str, subdir: str):
         subdir: 子目录（相对于仓库根目录）
     """
     repo = git.Repo(repo_path)
-    repo_root = Path(repo_path)
-    file_change_count = defaultdict(int)
 
     print(f"📊 正在分析 {subdir}/ 的 git 历史...")
     print()
 
-    # 统计每个文件的修改次数
-    for commit in repo.iter_commits():
+    # 统计每个文件的修改次数：单次 git log 拿到全部历史的修改路径，
+    # 替代逐 commit 调 diff()（GitPython 每次 diff 都要起子进程再解析，
+    # 几千个 commit 时这一步是主要开销），pathspec 过滤也交给 git 本身
+    log_output = repo.git.log("--name-only", "--pretty=format:", "--no-renames", "--", subdir + "/")
+    file_change_count = Counter(line for line in log_output.splitlines() if line)
+
+    # 只保留当前存在的文件：热循环里用 os.path.join + os.stat 这类 C 层
+    # 调用，省掉上万次 Path 对象构造和 is_file 背后的重复 stat
+    candidates = []
+    for file_path, count in file_change_count.items():
+        full_path = os.path.join(repo_path, file_path)
         try:
-            if commit.parents:
-                diffs = commit.parents[0].diff(commit)
-                for diff in diffs:
-                    file_path = diff.a_path or diff.b_path
-                    if file_path and file_path.startswith(subdir + "/"):
-                        file_change_count[file_path] += 1
-        except Exception:
+            st = os.stat(full_path)
+        except OSError:
             continue
-
-    # 只保留当前存在的文件
-    existing_files = []
-    total_tokens = 0
+        if stat.S_ISREG(st.st_mode):
+            candidates.append((file_path, count, full_path, st))
 
     print("🔢 正在计算 token 数量（使用 tiktoken o200k_base）...")
-    for file_path, count in file_change_count.items():
-        full_path = repo_root / file_path
-        if full_path.is_file():
-            tokens = count_tokens(full_path)
-            existing_files.append((file_path, count, tokens))
-            total_tokens += tokens
+
+    # (mtime, size) 没变的文件直接复用上次的 token 数，跑第二遍时
+    # 分词阶段基本零开销；缓存放在工作目录，按绝对路径做 key
+    try:
+        with open(TOKEN_CACHE_PATH, encoding="utf-8") as f:
+            token_cache = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        token_cache = {}
+
+    token_counts = [0] * len(candidates)
+    stale = []  # 需要重新分词的下标
+    for i, (_, _, full_path, st) in enumerate(candidates):
+        cached = token_cache.get(os.path.abspath(full_path))
+        if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+            token_counts[i] = cached[2]
+        else:
+            stale.append(i)
+
+    for i, tokens in zip(stale, count_tokens_batch([candidates[i][2] for i in stale])):
+        token_counts[i] = tokens
+        _, _, full_path, st = candidates[i]
+        token_cache[os.path.abspath(full_path)] = [st.st_mtime, st.st_size, tokens]
+
+    # 原子写回，避免中断留下半个缓存文件
+    tmp_path = TOKEN_CACHE_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(token_cache, f)
+    os.replace(tmp_path, TOKEN_CACHE_PATH)
+
+    existing_files = [
+        (file_path, count, tokens)
+        for (file_path, count, _, _), tokens in zip(candidates, token_counts)
+    ]
+    total_tokens = sum(token_counts)
 
     if not existing_files:
         print("❌ 没有找到文件")
@@ -81,8 +153,10 @@ def analyze_repo_stats(repo_path: str, subdir: str):
     # 按修改次数排序
     existing_files.sort(key=lambda x: x[1], reverse=True)
 
-    # 提取修改次数列表
-    change_counts = [count for _, count, _ in existing_files]
+    # 两列数据各取成一个 ndarray，分层统计全部走向量化切片 + 累计和
+    change_counts = np.fromiter((count for _, count, _ in existing_files), dtype=np.int32)
+    token_counts_arr = np.fromiter((tokens for _, _, tokens in existing_files), dtype=np.int64)
+    tokens_cum = token_counts_arr.cumsum()
 
     # 计算分位数
     percentiles = [50, 75, 90, 95, 99]
@@ -102,8 +176,8 @@ def analyze_repo_stats(repo_path: str, subdir: str):
     print()
 
     print(f"🔢 修改次数分布:")
-    print(f"   - 最小值: {min(change_counts)}")
-    print(f"   - 最大值: {max(change_counts)}")
+    print(f"   - 最小值: {change_counts.min()}")
+    print(f"   - 最大值: {change_counts.max()}")
     print(f"   - 平均值: {np.mean(change_counts):.1f}")
     print(f"   - 中位数: {np.median(change_counts):.1f}")
     print()
@@ -122,14 +196,12 @@ def analyze_repo_stats(repo_path: str, subdir: str):
     percentages = [1, 5, 10, 20, 30, 50, 80, 90, 100]
 
     for pct in percentages:
-        n_files = int(len(existing_files) * pct / 100)
-        if n_files == 0:
-            n_files = 1
-
-        top_files = existing_files[:n_files]
-        top_tokens = sum(tokens for _, _, tokens in top_files)
-        min_changes = min(count for _, count, _ in top_files) if top_files else 0
-        max_changes = max(count for _, count, _ in top_files) if top_files else 0
+        n_files = max(1, len(existing_files) * pct // 100)
+
+        # 已按修改次数降序排序：每层的 min/max/总量都是 O(1) 查表
+        top_tokens = int(tokens_cum[n_files - 1])
+        min_changes = int(change_counts[n_files - 1])
+        max_changes = int(change_counts[0])
 
         print(f"前 {pct:3d}% 文件 (Top {n_files:4d}):")
         print(f"   - 修改次数范围: {min_changes:3d} ~ {max_changes:3d}")
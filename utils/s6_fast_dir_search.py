@@ -0,0 +1,426 @@
+"""
+s6_fast_dir_search.py
+在大目录树（如 /mnt/moonfs 这类网络盘）里并行查找指定名字的文件/目录
+
+find 在高延迟文件系统上是串行 readdir，一个目录一个来回；
+这里把第一层目录切成批次分给多个 worker 并行扫描。
+"""
+
+import argparse
+import ctypes
+import os
+import queue
+import stat
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+from tqdm import tqdm
+
+# Linux 下直接调 getdents64 的快路径：跳过每个条目的 DirEntry 对象构造
+# 和文件名 UTF-8 解码，百万级条目的树上这部分分配开销占大头
+if sys.platform == "linux":
+    _libc = ctypes.CDLL("libc.so.6", use_errno=True)
+    _SYS_GETDENTS64 = {"x86_64": 217, "aarch64": 61}.get(os.uname().machine)
+else:
+    _libc = None
+    _SYS_GETDENTS64 = None
+
+_DT_UNKNOWN = 0
+_DT_DIR = 4
+
+
+def _raw_scandir(dir_path):
+    """
+    用 getdents64 读目录，产出 (name_bytes, d_type) 对（含 "." 和 ".."）
+
+    linux_dirent64 布局: u64 d_ino, u64 d_off, u16 d_reclen, u8 d_type, 文件名
+    """
+    fd = os.open(dir_path, os.O_RDONLY | os.O_DIRECTORY)
+    buf = ctypes.create_string_buffer(65536)
+    try:
+        while True:
+            n = _libc.syscall(_SYS_GETDENTS64, fd, buf, len(buf))
+            if n < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno), dir_path)
+            if n == 0:
+                return
+            raw = buf.raw
+            pos = 0
+            while pos < n:
+                d_reclen = int.from_bytes(raw[pos + 16:pos + 18], "little")
+                d_type = raw[pos + 18]
+                name_end = raw.index(b"\x00", pos + 19)
+                yield raw[pos + 19:name_end], d_type
+                pos += d_reclen
+    finally:
+        os.close(fd)
+
+
+# 进程内目录列表缓存：同一会话里连着搜多个目标、或浅搜索失败退回深搜时，
+# 同一批目录不用再读第二遍（类似 gcsfuse 的内核 list cache）；
+# 短 TTL 控制新鲜度，并发写最多是重复扫一次。条目数设上限，
+# 否则深搜百万目录会把整棵树的列表常驻在 RSS 里直到进程退出
+_LIST_CACHE: dict[tuple, tuple[float, list]] = {}
+_LIST_CACHE_TTL = 5.0
+_LIST_CACHE_MAX = 4096
+_LIST_CACHE_LOCK = threading.Lock()
+
+
+def _cached_listing(dir_path, scan):
+    """
+    带 TTL 和容量上限的目录列表缓存；scan 负责真正读目录并物化成列表
+
+    getdents 快路径和 scandir 回退路径的物化格式不同，缓存键里
+    带上 scan 本身，两种格式互不串台。插入时超过上限先清过期条目，
+    还不够就按插入顺序淘汰最老的，保证缓存大小有界。
+    """
+    now = time.monotonic()
+    key = (dir_path, scan)
+    cached = _LIST_CACHE.get(key)
+    if cached is not None and now - cached[0] < _LIST_CACHE_TTL:
+        return cached[1]
+    listing = scan(dir_path)
+    if len(_LIST_CACHE) >= _LIST_CACHE_MAX:
+        # 淘汰要遍历整个 dict，加锁避免多个 worker 同时清理 +
+        # 迭代期间被并发插入打断；正常命中/插入路径仍然无锁
+        with _LIST_CACHE_LOCK:
+            for k, (ts, _) in list(_LIST_CACHE.items()):
+                if now - ts >= _LIST_CACHE_TTL:
+                    _LIST_CACHE.pop(k, None)
+            while len(_LIST_CACHE) >= _LIST_CACHE_MAX:
+                _LIST_CACHE.pop(next(iter(_LIST_CACHE)), None)
+    _LIST_CACHE[key] = (now, listing)
+    return listing
+
+
+def _scan_raw(dir_path):
+    """getdents 快路径的物化扫描：[(name_bytes, d_type), ...]"""
+    return list(_raw_scandir(dir_path))
+
+
+def _scan_entries(dir_path):
+    """scandir 回退路径的物化扫描：[(name, is_dir), ...]"""
+    with os.scandir(dir_path) as entries:
+        return [(entry.name, entry.is_dir(follow_symlinks=False)) for entry in entries]
+
+
+# 每个根目录的自动调优结果缓存（同一会话里反复搜索不重新探测）
+_AUTOTUNE_CACHE: dict[str, int] = {}
+
+
+def _autotune_workers(root_dir):
+    """
+    针对具体文件系统探测合适的并发度
+
+    计算节点上 cpu_count 动辄 96，但 FUSE 挂载往往 4 个并发读就饱和，
+    线程再多只是排队。对第一层目录采样做 ~200ms 的微基准，
+    每个档位用互不重叠的样本切片（避免上一轮暖了缓存抬高下一轮），
+    选扫描吞吐最高的档位。
+    """
+    root_key = os.fspath(root_dir)
+    cached = _AUTOTUNE_CACHE.get(root_key)
+    if cached is not None:
+        return cached
+
+    try:
+        with os.scandir(root_dir) as entries:
+            sample = [e.path for e in entries if e.is_dir(follow_symlinks=False)][:64]
+    except OSError:
+        sample = []
+
+    if len(sample) < 16:
+        # 样本太小测不出差异，退回保守默认值
+        best = min(cpu_count() or 8, 8)
+        _AUTOTUNE_CACHE[root_key] = best
+        return best
+
+    def probe(dir_path):
+        try:
+            with os.scandir(dir_path) as it:
+                deque(it, maxlen=0)
+        except OSError:
+            pass
+
+    best, best_rate = 4, -1.0
+    for i, workers in enumerate((2, 4, 8, 16)):
+        chunk = sample[i::4]
+        start = time.monotonic()
+        done = 0
+        with ThreadPool(processes=workers) as pool:
+            for _ in pool.imap_unordered(probe, chunk):
+                done += 1
+                if time.monotonic() - start > 0.2:
+                    break
+        elapsed = max(time.monotonic() - start, 1e-6)
+        rate = done / elapsed
+        if rate > best_rate:
+            best, best_rate = workers, rate
+
+    _AUTOTUNE_CACHE[root_key] = best
+    print(f"⚙️ 并发度自动调优: {root_key} -> {best} workers (~{best_rate:.0f} dir/s)")
+    return best
+
+
+def scan_directory_batch(args):
+    """
+    扫描一批目录，查找匹配 target_name 的条目
+
+    进度不走共享队列：每个目录的访问计数随返回值一次性带回主进程，
+    避免逐目录的跨进程 IPC。
+
+    Args:
+        args: (batch, target_name, max_depth, stop_event) 元组
+              batch 是 [(目录路径, 当前深度), ...]；stop_event 非 None 时
+              表示调用方只要第一个命中，全体 worker 见到事件就提前收工
+
+    Returns:
+        (匹配路径列表, 本批访问的目录数)
+    """
+    batch, target_name, max_depth, stop_event = args
+    # intern 后 scandir 回退路径的名字比较可以走指针相等的快路径；
+    # getdents 快路径本来就比 bytes，不构造 str
+    target_name = sys.intern(target_name)
+    matches = []
+    visited = 0
+
+    # worker 内部用本地 deque 做完整 BFS 到 max_depth：递归不回主进程重新分发，
+    # 每个 readdir 的结果都在产生它的进程/内核缓存里趁热消费
+    queue = deque(batch)
+    use_raw = _SYS_GETDENTS64 is not None
+    target_bytes = target_name.encode("utf-8")
+    while queue:
+        if stop_event is not None and stop_event.is_set():
+            break
+        dir_path, current_depth = queue.popleft()
+        visited += 1
+        descend = current_depth + 1 < max_depth
+
+        # 不预检 islink/access：入队时已排除符号链接（类型位来自 readdir，
+        # 零额外 stat），权限问题由打开目录时抛 PermissionError 统一兜底
+        try:
+            if use_raw:
+                # 热循环里直接比 bytes，不匹配的条目连 str 都不构造
+                for name, d_type in _cached_listing(dir_path, _scan_raw):
+                    if name == b"." or name == b"..":
+                        continue
+                    if name == target_bytes:
+                        matches.append(os.path.join(dir_path, target_name))
+                    if not descend:
+                        continue
+                    if d_type == _DT_DIR:
+                        queue.append((os.path.join(dir_path, os.fsdecode(name)), current_depth + 1))
+                    elif d_type == _DT_UNKNOWN:
+                        # 个别文件系统不填 d_type，这时才退回一次 lstat
+                        child = os.path.join(dir_path, os.fsdecode(name))
+                        try:
+                            if stat.S_ISDIR(os.lstat(child).st_mode):
+                                queue.append((child, current_depth + 1))
+                        except OSError:
+                            pass
+            else:
+                for name, is_dir in _cached_listing(dir_path, _scan_entries):
+                    if name == target_name:
+                        matches.append(os.path.join(dir_path, name))
+                    if descend and is_dir:
+                        queue.append((os.path.join(dir_path, name), current_depth + 1))
+        except OSError:
+            continue
+
+        if stop_event is not None and matches:
+            stop_event.set()
+            break
+
+    return matches, visited
+
+
+def parallel_search(root_dirs, target_name, max_depth=3, num_workers=None, first_only=False):
+    """
+    并行搜索 root_dirs 下名为 target_name 的文件/目录
+
+    Args:
+        root_dirs: 搜索根目录（单个路径，或多个根目录/卷的列表）
+        target_name: 要查找的文件/目录名（精确匹配）
+        max_depth: 最大搜索深度
+        num_workers: worker 线程数（默认按根目录的文件系统自动调优）
+        first_only: 只要找到一个命中就提前停止（"这个 checkpoint 在哪"场景）
+
+    Returns:
+        排序去重后的匹配路径列表
+    """
+    if isinstance(root_dirs, (str, os.PathLike)):
+        root_dirs = [root_dirs]
+    if num_workers is None:
+        num_workers = _autotune_workers(root_dirs[0])
+
+    print(f"🔍 在 {', '.join(map(str, root_dirs))} 下查找 '{target_name}' "
+          f"(depth<={max_depth}, workers={num_workers})")
+
+    # 结果边到边去重：set 随流更新，不再先攒一个带重复的大列表最后再过一遍
+    result_set: set[str] = set()
+    # 只要任意一个命中时，事件让所有 worker 提前收工，
+    # O(整棵树) 退化为 O(首个命中的深度)
+    stop_event = threading.Event() if first_only else None
+    batch_size = 64
+
+    def _enumerate_root(root, out_queue):
+        """枚举一个根目录，攒够 batch_size 就推一批；结尾推 None 表示收工"""
+        pending = []
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.name == target_name:
+                        result_set.add(entry.path)
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append((entry.path, 1))
+                        if len(pending) >= batch_size:
+                            out_queue.put((pending, target_name, max_depth, stop_event))
+                            pending = []
+        except OSError as e:
+            print(f"❌ 无法读取根目录 {root}: {e}")
+        if pending:
+            out_queue.put((pending, target_name, max_depth, stop_event))
+        out_queue.put(None)
+
+    def _stream_batches():
+        """
+        每个根目录一个枚举线程，边产出边组批：第一批不等任何根目录枚举完
+        就能发给 worker——慢 FUSE 挂载上根目录 readdir 本身就要很久，
+        多个卷的枚举也互相重叠。小批次由空闲 worker 随取随做。
+        """
+        out_queue = queue.Queue()
+        for root in root_dirs:
+            threading.Thread(target=_enumerate_root, args=(root, out_queue), daemon=True).start()
+        finished = 0
+        while finished < len(root_dirs):
+            item = out_queue.get()
+            if item is None:
+                finished += 1
+            else:
+                yield item
+
+    # 线程而非进程：scandir/stat 期间会释放 GIL，线程天然共享内核的
+    # 页缓存和 dentry 缓存，还省掉 fork + 逐批 pickle 的开销
+    with ThreadPool(processes=num_workers) as pool:
+        with tqdm(desc="扫描目录", unit="dir") as pbar:
+            for matches, visited in pool.imap_unordered(
+                scan_directory_batch, _stream_batches(), chunksize=1
+            ):
+                result_set.update(matches)
+                pbar.update(visited)
+                if first_only and result_set:
+                    break
+
+    return sorted(result_set)
+
+
+def fast_shallow_search(root_dirs, target_name, num_workers=None):
+    """
+    只搜两层的快速路径：第一层直接比名字，第二层并行扫
+
+    Args:
+        root_dirs: 搜索根目录（单个路径，或多个根目录/卷的列表）
+        target_name: 要查找的文件/目录名（精确匹配）
+        num_workers: worker 线程数（默认按根目录的文件系统自动调优）
+
+    Returns:
+        排序去重后的匹配路径列表
+    """
+    if isinstance(root_dirs, (str, os.PathLike)):
+        root_dirs = [root_dirs]
+    if num_workers is None:
+        num_workers = _autotune_workers(root_dirs[0])
+
+    result_set: set[str] = set()
+    first_level = []
+
+    def seed_root(root):
+        """枚举一个根目录的第一层（多个卷时在线程里并行跑）"""
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.name == target_name:
+                        result_set.add(entry.path)
+                    if entry.is_dir(follow_symlinks=False):
+                        first_level.append(entry.path)
+        except OSError as e:
+            print(f"❌ 无法读取根目录 {root}: {e}")
+
+    if len(root_dirs) == 1:
+        seed_root(root_dirs[0])
+    else:
+        seed_threads = [
+            threading.Thread(target=seed_root, args=(root,)) for root in root_dirs
+        ]
+        for thread in seed_threads:
+            thread.start()
+        for thread in seed_threads:
+            thread.join()
+
+    if not first_level:
+        return sorted(result_set)
+
+    # 见 scan_directory_batch：intern 让逐条目的名字比较命中指针相等快路径
+    target_name = sys.intern(target_name)
+
+    def scan_one(dir_path):
+        """扫描一个第一层目录的直接子项"""
+        # 不做 os.access 预检：读不了的目录让 scandir 抛 PermissionError，
+        # 每个目录省一次 faccessat 系统调用
+        found = []
+        try:
+            for name, _is_dir in _cached_listing(dir_path, _scan_entries):
+                if name == target_name:
+                    found.append(os.path.join(dir_path, name))
+        except OSError:
+            pass
+        return found
+
+    # 线程池里 worker 可以直接用闭包，不再需要为 pickle 而设的模块级函数；
+    # 结果单趟流式聚合：不先 list() 物化所有批次，峰值内存从
+    # O(全部结果之和) 降到 O(单个批次)
+    with ThreadPool(processes=num_workers) as pool:
+        for result in tqdm(
+            pool.imap_unordered(scan_one, first_level, chunksize=16),
+            total=len(first_level),
+            desc="扫描目录",
+            unit="dir",
+        ):
+            result_set.update(result)
+
+    return sorted(result_set)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并行查找指定名字的文件/目录")
+    parser.add_argument("root", nargs="+", help="搜索根目录（可以给多个卷）")
+    parser.add_argument("target", help="要查找的文件/目录名（精确匹配）")
+    parser.add_argument("--depth", type=int, default=3, help="最大搜索深度（默认 3）")
+    parser.add_argument("--workers", type=int, default=None, help="worker 数量")
+    parser.add_argument("--shallow", action="store_true", help="只搜两层的快速模式")
+    parser.add_argument("--first", action="store_true", help="找到第一个命中就停止（深搜模式）")
+
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.shallow:
+        matches = fast_shallow_search(args.root, args.target, args.workers)
+    else:
+        matches = parallel_search(args.root, args.target, args.depth, args.workers, args.first)
+    elapsed = time.time() - start
+
+    print()
+    if matches:
+        print(f"✅ 找到 {len(matches)} 个匹配 (耗时 {elapsed:.1f}s):")
+        for match in matches:
+            print(f"   {match}")
+    else:
+        print(f"❌ 没有找到 '{args.target}' (耗时 {elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@
 import asyncio
 import os
 import sys
+from functools import lru_cache
 from pathlib import Path
 
 # Add parent directory to path to import from scripts
@@ -17,6 +18,19 @@ from scripts.s2_generate_readme import (
 from openai import AsyncOpenAI
 
 
+# 在 notebook / 长会话里反复跑这个脚本时，目录树和内容收集不用每次都
+# 重新走盘：按 (路径, explain 根目录的 mtime) 做进程内缓存，
+# explain 输出没变就直接复用上一次的遍历结果
+@lru_cache(maxsize=32)
+def _cached_tree(folder: str, explain_base: str, _root_mtime: int) -> str:
+    return generate_tree_structure(Path(folder), Path(explain_base))
+
+
+@lru_cache(maxsize=32)
+def _cached_content(folder: str, explain_base: str, _root_mtime: int) -> str:
+    return collect_folder_content(Path(folder), Path(explain_base))
+
+
 async def main():
     # 从命令行参数获取配置，或使用默认值
     if len(sys.argv) > 1:
@@ -36,38 +50,41 @@ async def main():
     print(f"📂 目标文件: {explain_base / 'README.md'}")
     print()
 
-    # 1. 生成目录树结构
-    print("🌲 生成目录树结构...")
-    tree_structure = generate_tree_structure(folder_path, explain_base)
-    print(f"目录树:\n{tree_structure}")
-    print()
+    # 客户端先建好，两个磁盘遍历丢进线程并行跑；
+    # 都就绪的瞬间 API 请求就能发出去（墙钟大头是 LLM 调用）
+    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+    root_mtime = int(explain_base.stat().st_mtime)
 
-    # 2. 收集文件夹内容
-    print("📄 收集文件夹内容...")
-    content = collect_folder_content(folder_path, explain_base)
+    # 1+2. 并行生成目录树结构、收集文件夹内容
+    print("🌲 生成目录树 + 📄 收集文件夹内容（并行）...")
+    tree_structure, content = await asyncio.gather(
+        asyncio.to_thread(_cached_tree, str(folder_path), str(explain_base), root_mtime),
+        asyncio.to_thread(_cached_content, str(folder_path), str(explain_base), root_mtime),
+    )
+    print(f"目录树:\n{tree_structure}")
     print(f"内容长度: {len(content)} 字符")
     print()
 
-    # 3. 调用 API 生成 README
+    # 3. 调用 API 生成 README（ask_gemini_async 流式写盘 + 原子替换）
     print("🤖 调用 Gemini API 生成 README...")
-    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-
     folder_display_name = explain_base.parent.name  # "SELF-PARAM"
+    readme_path = explain_base / "README.md"
 
-    readme_content = await ask_gemini_async(
+    success = await ask_gemini_async(
         folder_display_name,
         content,
         tree_structure,
+        readme_path,
         client,
-        "gemini-3-pro-preview"
+        "gemini-3-pro-preview",
     )
+    if not success:
+        print("❌ README 生成失败")
+        return
 
-    # 4. 保存结果
-    readme_path = explain_base / "README.md"
-    with open(readme_path, "w", encoding="utf-8") as f:
-        f.write(f"# {folder_display_name}\n\n")
-        f.write(readme_content)
-
+    # 读预览也别阻塞事件循环——脚本被当作批量生成的一个 task 复用时，
+    # 循环上的同步文件 I/O 会卡住其他并发请求的调度
+    readme_content = await asyncio.to_thread(readme_path.read_text, encoding="utf-8")
     print(f"✅ 成功生成 README: {readme_path}")
     print()
     print("=" * 60)
@@ -3,16 +3,124 @@ utils.py
 通用工具函数
 """
 
-from datetime import datetime
+import asyncio
+import functools
+import os
+import subprocess
+import time
+from collections import deque
 from pathlib import Path
 
-import git
+
+@functools.lru_cache(maxsize=None)
+def get_tokenizer(name: str = "o200k_base"):
+    """
+    进程内共享的 tiktoken tokenizer
+
+    BPE 表有几十 MB，lru_cache 保证同名编码只加载一次；
+    惰性 import 让不用 tokenizer 的脚本不付加载成本。
+    """
+    import tiktoken
+
+    return tiktoken.get_encoding(name)
+
+
+def git_command(repo_path: str, *args: str) -> list[str]:
+    """
+    构造只读 git 命令的 argv
+
+    统一关闭 auto-gc、fsmonitor 和可选锁——批量读历史时这些都是纯开销，
+    大仓库上每次调用都能省一点启动延迟。
+
+    Args:
+        repo_path: 仓库路径
+        *args: git 子命令及参数
+
+    Returns:
+        完整的 argv 列表，可直接传给 subprocess
+    """
+    return [
+        "git",
+        "-c", "gc.auto=0",
+        "-c", "core.fsmonitor=false",
+        "--no-optional-locks",
+        "-C", str(repo_path),
+        *args,
+    ]
+
+
+def git_env() -> dict[str, str]:
+    """构造 git 子进程的环境变量（关闭可选锁和 pager）"""
+    return {**os.environ, "GIT_OPTIONAL_LOCKS": "0", "GIT_PAGER": "cat"}
+
+
+class AsyncRateLimiter:
+    """
+    简单的异步速率限制器（滑动窗口，支持可变消耗）
+
+    默认每次 acquire 消耗 1（按每分钟请求数限流）；传入 cost 可以按
+    token 数等任意单位限流（TPM）。
+
+    用法:
+        limiter = AsyncRateLimiter(max_rate=300)
+        async with limiter:
+            await client.chat.completions.create(...)
+
+        tpm_limiter = AsyncRateLimiter(max_rate=2_000_000)
+        await tpm_limiter.acquire(cost=estimated_tokens)
+    """
+
+    def __init__(self, max_rate: int, time_period: float = 60.0):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._events: deque[tuple[float, int]] = deque()  # (时间戳, 消耗)
+        self._in_window = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, cost: int = 1):
+        """等待直到窗口内累计消耗 + cost 不超过 max_rate"""
+        # 单笔超过上限的请求也要放行，否则会永远等下去
+        cost = min(cost, self.max_rate)
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                # 清理窗口外的旧事件
+                while self._events and now - self._events[0][0] >= self.time_period:
+                    self._in_window -= self._events.popleft()[1]
+                if self._in_window + cost <= self.max_rate:
+                    self._events.append((now, cost))
+                    self._in_window += cost
+                    return
+                wait = self.time_period - (now - self._events[0][0])
+            await asyncio.sleep(wait)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_commit_date(resolved_repo_path: str) -> str:
+    """按解析后的绝对路径缓存 commit 日期，一次 git 子进程搞定"""
+    output = subprocess.check_output(
+        git_command(resolved_repo_path, "log", "-1", "--format=%cs"),
+        env=git_env(),
+        text=True,
+    )
+    return output.strip()
 
 
 def get_commit_date(repo_path: str) -> str:
     """
     获取仓库最新 commit 的日期
 
+    同一个仓库在批量生成时会被反复询问；结果按绝对路径做 lru_cache，
+    等价的路径写法命中同一条缓存。冷启动也只是一次
+    `git log -1 --format=%cs`，不走 GitPython 的对象图。
+
     Args:
         repo_path: 仓库路径
 
@@ -23,10 +131,7 @@ def get_commit_date(repo_path: str) -> str:
         Exception: 如果无法获取 commit 日期
     """
     try:
-        repo = git.Repo(repo_path)
-        latest_commit = repo.head.commit
-        commit_date = datetime.fromtimestamp(latest_commit.committed_date)
-        return commit_date.strftime("%Y-%m-%d")
+        return _cached_commit_date(str(Path(repo_path).resolve()))
     except Exception as e:
         raise Exception(f"无法获取 {repo_path} 的 commit 日期: {e}")
 